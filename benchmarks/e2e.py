@@ -0,0 +1,257 @@
+"""End-to-end benchmark against a local Gemini stand-in.
+
+Generates synthetic CSVs and SQLite databases, points gemini_api at a local
+stub server that returns canned <pandas>/<sql>/<chat> responses, and times
+loading, schema generation, each query path and the Visualizer renderers.
+
+    python benchmarks/e2e.py [--sizes 10000 100000] [--latency 0.2] [--output report.json]
+    python benchmarks/e2e.py --compare baseline.json --output current.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+from streamlit import logger as st_logger  # noqa: E402
+st_logger.set_log_level("error")  # renderers run outside `streamlit run`
+
+import gemini_api  # noqa: E402
+import query_processor  # noqa: E402
+from data_handler import DataHandler  # noqa: E402
+from query_processor import QueryProcessor  # noqa: E402
+from visualization import Visualizer  # noqa: E402
+
+# Question -> canned model response; the stub answers by finding the question in the prompt
+RESPONSES = {
+    "pandas: revenue by category": "<pandas>df.groupby('category')['price'].sum()</pandas>"
+                                   "<explain>Sums price per category</explain>",
+    "pandas: top orders": "<pandas>df.sort_values('price', ascending=False).head(20)</pandas>"
+                          "<explain>The 20 most expensive orders</explain>",
+    "pandas: filter": "<pandas>df[(df['price'] > 50) & (df['qty'] < 5)]</pandas>"
+                      "<explain>Expensive orders with few items</explain>",
+    "sql: revenue by region": "<sql>SELECT region, SUM(price * qty) AS revenue FROM data GROUP BY region "
+                              "ORDER BY revenue DESC</sql><explain>Revenue per region</explain>",
+    "chat: columns": "<chat>The dataset has order, pricing and region columns.</chat>",
+}
+PATHS = {"pandas": [q for q in RESPONSES if q.startswith("pandas")],
+         "sql": [q for q in RESPONSES if q.startswith("sql")],
+         "chat": [q for q in RESPONSES if q.startswith("chat")]}
+
+
+# -------------------------
+# Gemini stand-in
+# -------------------------
+class _StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.startswith("/v1beta/cachedContents"):
+            return self._reply({"name": "cachedContents/benchmark"})
+
+        time.sleep(self.latency)
+        text = json.dumps(body.get("contents", []))
+        answer = next((r for q, r in RESPONSES.items() if q in text), "<chat>I don't know.</chat>")
+        self._reply({"candidates": [{"content": {"parts": [{"text": answer}]}}]})
+
+    def _reply(self, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(latency):
+    """Serve the stub on a free local port and route gemini_api to it"""
+    handler = type("StubHandler", (_StubHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    gemini_api.API_BASE = f"http://127.0.0.1:{server.server_port}"
+    gemini_api.GEMINI_API_KEY = "benchmark"
+    return server
+
+
+# -------------------------
+# Synthetic data
+# -------------------------
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    price = rng.random(rows) * 100
+    price[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "price": price,
+        "qty": rng.integers(1, 20, rows),
+        "discount": rng.random(rows) * 0.3,
+        "category": rng.choice(list("abcdefgh"), rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "created": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h"),
+    })
+
+
+def write_datasets(rows, directory):
+    """CSV and SQLite copies of the same synthetic table"""
+    df = make_frame(rows)
+    csv_path = os.path.join(directory, f"orders_{rows}.csv")
+    db_path = os.path.join(directory, f"orders_{rows}.db")
+    df.to_csv(csv_path, index=False)
+    with sqlite3.connect(db_path) as conn:
+        df.to_sql("orders", conn, index=False, if_exists="replace")
+    conn.close()
+    return csv_path, db_path
+
+
+# -------------------------
+# Timing
+# -------------------------
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "runs": repeat}
+
+
+def bench_size(rows, directory, repeat):
+    results = {}
+    csv_path, db_path = write_datasets(rows, directory)
+
+    def load_csv():
+        with open(csv_path, "rb") as f:
+            df, errors = DataHandler.load_csv(f)
+        if df is None:
+            raise RuntimeError(f"load_csv failed: {errors}")
+        return df
+    results["load_csv"] = measure(load_csv, repeat)
+    df = load_csv()
+
+    params = {"database": db_path}
+    conn, _, error = DataHandler.load_from_database("SQLite", params)
+    if error:
+        raise RuntimeError(error)
+    try:
+        results["load_table"] = measure(lambda: DataHandler.load_table(conn, "orders", "SQLite", limit=rows), repeat)
+        results["load_table_sample"] = measure(
+            lambda: DataHandler.load_table(conn, "orders", "SQLite", limit=max(rows // 10, 1), sample=True,
+                                           row_estimate=rows), repeat)
+    finally:
+        DataHandler.release_connection("SQLite", params, conn)
+
+    results["generate_schema"] = measure(lambda: DataHandler.generate_schema(df, "csv"), repeat)
+    schema = DataHandler.generate_schema(df, "csv")
+
+    processor = QueryProcessor()
+    for path, questions in PATHS.items():
+        def ask():
+            for question in questions:
+                response = processor.process_query(question, df, schema, None)
+                if response["type"] == "error":
+                    raise RuntimeError(f"{question}: {response['content']}")
+        # Cold: every run recomputes; warm: answered from the result cache
+        results[f"process_query_{path}"] = measure(ask, repeat, setup=query_processor.result_cache.clear)
+        if path != "chat":
+            results[f"process_query_{path}_cached"] = measure(ask, repeat)
+
+    viz = Visualizer(df)
+    for name in ("render_missing_values_analysis", "render_correlation_analysis", "render_distribution_analysis"):
+        results[f"visualizer_{name[len('render_'):]}"] = measure(getattr(viz, name), repeat, setup=lambda: plt.close("all"))
+    plt.close("all")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(report, baseline):
+    """Print median times of this run against a previous report"""
+    for key in ("latency", "sandbox", "repeat"):
+        if baseline.get("meta", {}).get(key) != report["meta"][key]:
+            print(f"Note: {key} differs (baseline {baseline.get('meta', {}).get(key)}, current {report['meta'][key]})")
+    print(f"\n{'benchmark':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size, results in report["results"].items():
+        for name, timing in results.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            change = (timing["median"] / before["median"] - 1) * 100 if before["median"] else 0.0
+            print(f"{size + ' ' + name:<48} {before['median'] * 1000:>8.1f}ms {timing['median'] * 1000:>8.1f}ms "
+                  f"{change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--latency", type=float, default=0.0, help="stub model latency in seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-sandbox", action="store_true", help="evaluate generated code in-process")
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--compare", help="previous report to compare against")
+    args = parser.parse_args()
+
+    if args.no_sandbox:
+        query_processor.SANDBOX_ENABLED = False
+    server = start_stub_server(args.latency)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "repeat": args.repeat,
+            "sandbox": query_processor.SANDBOX_ENABLED,
+        },
+        "results": {},
+    }
+    try:
+        with tempfile.TemporaryDirectory(prefix="datasense_bench_") as directory:
+            for rows in args.sizes:
+                results = bench_size(rows, directory, args.repeat)
+                report["results"][str(rows)] = results
+                print(f"{rows:,} rows")
+                for name, timing in results.items():
+                    print(f"  {name:<44} {timing['median'] * 1000:>9.1f}ms (min {timing['min'] * 1000:.1f}ms)")
+    finally:
+        server.shutdown()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Check that ExpressionOptimizer rewrites are result-equivalent and time them.
+
+    python benchmarks/expr_optimizer.py [rows]
+"""
+import ast
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from expr_optimizer import optimize_expression, HELPERS  # noqa: E402
+
+# Expressions as the model emits them; each must trigger at least one rewrite.
+# Some fail unoptimized (mean over text columns), and must fail the same way optimized
+CORPUS = [
+    "df.sort_values('price', ascending=False).head(10)",
+    "df.sort_values(by='qty').head(5)",
+    "df['price'].sort_values(ascending=False).head(3)",
+    "df.sort_values('category', ascending=False).head(10)",
+    "df.sort_values('discount', ascending=False).head(10)",
+    "df[df['price'] > 50][df['qty'] < 5]",
+    "df[df.price > 10][df.category.isin(['a', 'b'])][~df.discount.isna()]",
+    "df.groupby('category').sum()['price']",
+    "df.groupby(['category', 'region']).mean()[['price', 'qty']]",
+    "df.groupby('region').max()['price']",
+    "df.groupby('region').mean()['price']",
+    "df.groupby('category').count()['created']",
+    "df.groupby('category')['price'].apply(lambda s: s.sum())",
+    "df.groupby('region')['qty'].agg(np.mean)",
+    "df.groupby('region')['qty'].apply(len)",
+    "df.groupby('category')['price'].apply(lambda v: np.max(v))",
+    "df.groupby('category').apply(lambda g: g['price'].sum())",
+    "df.groupby(['category', 'region']).apply(lambda g: g.qty.mean())",
+    "df.groupby('region').apply(lambda g: np.max(g['discount']))",
+    "df.groupby('category').apply(len)",
+]
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    discount = rng.random(rows)
+    discount[rng.random(rows) < 0.1] = np.nan
+    return pd.DataFrame({
+        "price": rng.random(rows) * 100,
+        "qty": rng.integers(0, 20, rows),
+        "category": rng.choice(list("abcdefgh"), rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "discount": discount,
+        "created": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h"),
+    })
+
+
+def evaluate(tree, df):
+    # Names go in globals so lambdas in the unoptimized expressions can see them
+    env = {"__builtins__": {"len": len}, "df": df, "pd": pd, "np": np, **HELPERS}
+    return eval(compile(tree, "<bench>", "eval"), env)
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class StableSorts(ast.NodeTransformer):
+    """Pass kind='stable' to every sort_values call.
+
+    The default quicksort is unstable, so tied rows may come out in any order;
+    topk keeps tied rows in their original order, which is the stable sort's.
+    """
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Attribute) and node.func.attr == "sort_values":
+            node.keywords.append(ast.keyword("kind", ast.Constant("stable")))
+        return node
+
+
+def mismatch(expected, result):
+    """Why result differs from expected (the full objects, index and dtypes included), or None"""
+    try:
+        if isinstance(expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(result, expected)
+        elif isinstance(expected, pd.Series):
+            pd.testing.assert_series_equal(result, expected)
+        else:
+            assert result == expected, f"{result!r} != {expected!r}"
+    except AssertionError as e:
+        return str(e).strip().splitlines()[0]
+    return None
+
+
+def outcome(fn):
+    """(result, None), or (None, the exception) when fn raises"""
+    try:
+        return fn(), None
+    except Exception as e:
+        return None, e
+
+
+def main(rows):
+    df = make_frame(rows)
+    print(f"{rows:,} rows")
+    print(f"{'expression':<72} {'rewrites':<28} {'before':>9} {'after':>9} {'speedup':>8}")
+    failures = 0
+    for expr in CORPUS:
+        original = ast.parse(expr, mode="eval")
+        optimized, rewrites = optimize_expression(ast.parse(expr, mode="eval"))
+        if not rewrites:
+            print(f"{expr:<72} NOT REWRITTEN")
+            failures += 1
+            continue
+        stable = ast.fix_missing_locations(StableSorts().visit(ast.parse(expr, mode="eval")))
+        expected, expected_error = outcome(lambda: evaluate(stable, df))
+        result, error = outcome(lambda: evaluate(optimized, df))
+        # Both sides must succeed with equal results, or both raise the same exception type
+        if expected_error or error:
+            problem = None if type(error) is type(expected_error) else \
+                f"outcomes differ: {expected_error!r} vs {error!r}"
+        else:
+            problem = mismatch(expected, result)
+        failures += problem is not None
+
+        if expected_error or error:
+            status = f"  raises {type(expected_error or error).__name__}" if problem is None else f"  MISMATCH: {problem}"
+            print(f"{expr:<72} {','.join(rewrites):<28}{status}")
+            continue
+        before = best_of(lambda: evaluate(original, df), 3)
+        after = best_of(lambda: evaluate(optimized, df), 3)
+        status = "" if problem is None else f"  MISMATCH: {problem}"
+        print(f"{expr:<72} {','.join(rewrites):<28} {before * 1000:>7.1f}ms {after * 1000:>7.1f}ms "
+              f"{before / after:>7.1f}x{status}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000) else 0)
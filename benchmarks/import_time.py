@@ -0,0 +1,108 @@
+"""Measure cold-start import time of the app's entry points with `python -X importtime`.
+
+Fails (exit 1) when a module that should be deferred is imported at startup
+(modules pandas itself imports, e.g. pyarrow, don't count), or when an entry
+point exceeds --budget-ms.
+
+    python benchmarks/import_time.py [--repeat 3] [--budget-ms 2500] [--output imports.json]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Loaded on first use only: plotting, HTTP, optional accelerators and database drivers
+DEFERRED = ["matplotlib", "seaborn", "requests", "numexpr", "pyarrow", "http.server",
+            "psycopg2", "mysql", "pyodbc", "pymongo", "redis", "cassandra"]
+
+
+def app_imports():
+    """Modules src/app.py imports at top level (importing app.py itself would run the UI)"""
+    with open(os.path.join(SRC, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def entry_points():
+    return {
+        "app": app_imports(),
+        # What each sandbox worker process imports before its first job
+        "sandbox_worker": ["query_processor"],
+        "batch": ["batch"],
+    }
+
+
+def _project_modules():
+    return {os.path.splitext(f)[0] for f in os.listdir(SRC) if f.endswith(".py")}
+
+
+def measure(modules):
+    """One cold interpreter importing modules; returns (total ms, {package: cumulative ms}, loaded names)"""
+    env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    code = "; ".join(f"import {m}" for m in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, cwd=SRC, env=env, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    project = _project_modules()
+    total_us, packages, loaded = 0, {}, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name.strip()
+        total_us += int(self_us)
+        loaded.add(name)
+        # Third-party/stdlib packages; project modules would just repeat the total
+        if "." not in name and name not in project and not name.startswith("_"):
+            packages[name] = int(cumulative_us) / 1000
+    return total_us / 1000, packages, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="cold runs per entry point (min is reported)")
+    parser.add_argument("--budget-ms", type=float, help="fail if an entry point's import time exceeds this")
+    parser.add_argument("--top", type=int, default=8, help="heaviest packages to list")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    _, _, baseline = measure(["pandas"])
+    report, failures = {}, 0
+    for name, modules in entry_points().items():
+        runs = [measure(modules) for _ in range(args.repeat)]
+        total, packages, loaded = min(runs, key=lambda run: run[0])
+        eager = sorted(m for m in DEFERRED
+                       if any(n == m or n.startswith(m + ".") for n in loaded - baseline))
+        report[name] = {"total_ms": round(total, 1), "eager": eager,
+                        "packages_ms": dict(sorted(packages.items(), key=lambda kv: -kv[1]))}
+
+        print(f"{name}: {total:,.0f} ms")
+        for module, ms in list(report[name]["packages_ms"].items())[:args.top]:
+            print(f"  {module:<32} {ms:>8.1f} ms")
+        if eager:
+            print(f"  FAIL: imported at startup, should be deferred: {', '.join(eager)}")
+            failures += 1
+        if args.budget_ms is not None and total > args.budget_ms:
+            print(f"  FAIL: over the {args.budget_ms:,.0f} ms budget")
+            failures += 1
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
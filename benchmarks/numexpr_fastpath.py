@@ -0,0 +1,111 @@
+"""Time every numexpr plan shape against plain pandas evaluation.
+
+The fast path only takes the shapes that come out faster here; the rest
+are timed too, to show why they stay on the plain path. Results go
+through QueryProcessor.safe_eval both ways and must be equal.
+
+    python benchmarks/numexpr_fastpath.py [rows]
+"""
+import ast
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import query_processor  # noqa: E402
+from expr_optimizer import _to_numexpr, _is_comparison_mask  # noqa: E402
+from query_processor import QueryProcessor, compile_expression, fast_path_plan, NUMEXPR_AVAILABLE  # noqa: E402
+
+# Filters and arithmetic as the model emits them, from single comparisons to fused arithmetic
+CORPUS = [
+    "df['price'] * df['qty'] * (1 - df['discount'])",
+    "df['price'] * df['qty'] + df['shipping'] / 2",
+    "df['price'] * 1.2 - df['discount'] * df['price']",
+    "df['price'] * df['qty']",
+    "df[df['price'] * df['qty'] > 500]",
+    "df[(df['price'] * df['qty'] > 500) & (df['discount'] < 0.2)]",
+    "df[df.price ** 2 + df.shipping ** 2 < 2500]",
+    "df[df['price'] > 50]",
+    "df[(df['price'] > 100) & (df['qty'] < 5)]",
+    "df[(df['price'] > 50) & (df['qty'] < 5) | (df['discount'] > 0.4)]",
+]
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    discount = rng.random(rows) * 0.5
+    discount[rng.random(rows) < 0.1] = np.nan
+    return pd.DataFrame({
+        "price": rng.random(rows) * 100,
+        "qty": rng.integers(0, 20, rows),
+        "discount": discount,
+        "shipping": rng.random(rows) * 30,
+    })
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def plain_eval(expr, df):
+    threshold = query_processor.FASTPATH_MIN_ROWS
+    query_processor.FASTPATH_MIN_ROWS = float("inf")
+    try:
+        return QueryProcessor.safe_eval(expr, df)
+    finally:
+        query_processor.FASTPATH_MIN_ROWS = threshold
+
+
+def candidate_plan(expr):
+    """The numexpr plan for expr with no shape excluded, or None when numexpr can't express it"""
+    body = ast.parse(expr, mode="eval").body
+    columns = []
+    if isinstance(body, ast.Subscript) and _is_comparison_mask(body.slice):
+        kind, text = "filter", _to_numexpr(body.slice, columns, [])
+    else:
+        kind, text = "eval", _to_numexpr(body, columns, [])
+    return (kind, text, tuple(columns)) if text and columns else None
+
+
+def main(rows):
+    if not NUMEXPR_AVAILABLE:
+        print("numexpr is not installed; safe_eval always uses plain evaluation")
+        return 1
+    import numexpr
+    df = make_frame(rows)
+    print(f"{rows:,} rows, numexpr threads: {numexpr.get_num_threads()}")
+    print(f"{'expression':<68} {'path':<8} {'plain':>9} {'numexpr':>9} {'speedup':>8}")
+    failures = 0
+    for expr in CORPUS:
+        plan = fast_path_plan(expr)
+        expected = plain_eval(expr, df)
+        result = QueryProcessor.safe_eval(expr, df)
+        ok = expected.equals(result)
+
+        # Time the evaluation step alone; result limits and summaries cost the same either way
+        code = compile_expression(expr)
+        env = {"__builtins__": {}}
+        names = {"df": df, "pd": pd, "np": np, **query_processor.OPTIMIZER_HELPERS}
+        candidate = candidate_plan(expr)
+        plain = best_of(lambda: eval(code, env, names), 5)
+        fast = best_of(lambda: QueryProcessor._eval_numexpr(candidate, df), 5)
+        # A shape on the fast path must be faster; one left off it is only reported
+        slower = plan is not None and fast >= plain
+        failures += not ok or slower
+        status = ("" if ok else "  MISMATCH") + ("  SLOWER ON FAST PATH" if slower else "")
+        print(f"{expr:<68} {plan[0] if plan else 'plain':<8} {plain * 1000:>7.1f}ms {fast * 1000:>7.1f}ms "
+              f"{plain / fast:>7.1f}x{status}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000) else 0)
@@ -0,0 +1,107 @@
+"""Check that generated code returns the same thing in a sandbox worker as in-process.
+
+    python benchmarks/sandbox_parity.py [rows]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from query_processor import QueryProcessor  # noqa: E402
+from sandbox import SandboxPool, SandboxError  # noqa: E402
+
+# (kind, code) as the model emits them, over NaNs, nullable integers, dates and strings
+CORPUS = [
+    ("pandas", "(df.price > 50).mean()"),
+    ("pandas", "df.price.mean()"),
+    ("pandas", "df.price.isna().sum()"),
+    ("pandas", "df[df['created'] > '2024-06-01']"),
+    ("pandas", "df.created.dt.year.value_counts()"),
+    ("pandas", "df.groupby(df.created.dt.month)['price'].sum()"),
+    ("pandas", "df[df.category.str.contains('a')]"),
+    ("pandas", "df.region.str.contains('th')"),
+    ("pandas", "df.region.str.upper().head(20)"),
+    ("pandas", "df.dtypes"),
+    ("pandas", "df.describe()"),
+    ("pandas", "df.groupby('tier')['qty'].mean()"),
+    ("pandas", "df.rating.fillna(0).sum()"),
+    ("pandas", "df[df['price'] > 50][df['qty'] < 5]"),
+    ("pandas", "df.sort_values('price', ascending=False).head(10)"),
+    ("pandas", "df.price.astype(int)"),
+    ("pandas", "df['created'] + pd.Timedelta(days=1)"),
+    ("sql", "SELECT region, AVG(price) AS avg_price FROM data GROUP BY region ORDER BY region"),
+    ("sql", "SELECT COUNT(*) AS n FROM data WHERE price IS NULL"),
+]
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    price = rng.random(rows) * 100
+    price[rng.random(rows) < 0.05] = np.nan
+    rating = pd.array(rng.integers(1, 6, rows), dtype="Int64")
+    rating[rng.random(rows) < 0.1] = pd.NA
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "price": price,
+        "qty": rng.integers(1, 20, rows),
+        "category": rng.choice(list("abcdefgh"), rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "tier": rng.choice(["gold", "silver", "bronze"], rows),
+        "rating": rating,
+        "created": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h"),
+    })
+
+
+def run_in_process(kind, code, df):
+    if kind == "pandas":
+        return QueryProcessor.safe_eval(code, df)
+    return QueryProcessor.run_sql(code, df)
+
+
+def outcome(fn):
+    """(result, None) or (None, error message)"""
+    try:
+        return fn(), None
+    except (SandboxError, ValueError) as e:
+        return None, str(e)
+
+
+def mismatch(expected, result):
+    """Why result differs from expected (index and dtypes included), or None"""
+    try:
+        if isinstance(expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(result, expected)
+        elif isinstance(expected, pd.Series):
+            pd.testing.assert_series_equal(result, expected)
+        elif isinstance(expected, float) and np.isnan(expected):
+            assert isinstance(result, float) and np.isnan(result), f"{result!r} != nan"
+        else:
+            assert type(result) is type(expected) and result == expected, f"{result!r} != {expected!r}"
+    except AssertionError as e:
+        return str(e).strip().splitlines()[0]
+    return None
+
+
+def main(rows):
+    df = make_frame(rows)
+    pool = SandboxPool(size=1)
+    # Frames with dtypes Arrow doesn't round-trip go to workers pickled; this one goes through Arrow
+    print(f"{rows:,} rows")
+    failures = 0
+    for kind, code in CORPUS:
+        expected, expected_error = outcome(lambda: run_in_process(kind, code, df))
+        result, error = outcome(lambda: pool.run(kind, code, df))
+        if expected_error or error:
+            problem = None if error == expected_error else f"errors differ: {expected_error!r} vs {error!r}"
+        else:
+            problem = mismatch(expected, result)
+        failures += problem is not None
+        print(f"{kind:<6} {code:<88} {'ok' if problem is None else 'MISMATCH: ' + problem}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000) else 0)
@@ -1,6 +1,12 @@
+import inspect
+import os
 import streamlit as st
+import uuid
 import pandas as pd
-from config import PAGE_TITLE, PAGE_LAYOUT, GEMINI_API_KEY
+from config import (
+    PAGE_TITLE, PAGE_LAYOUT, GEMINI_API_KEY, JOB_POLL_INTERVAL, REFRESH_INTERVAL,
+    PREVIEW_ROWS_DEFAULT, PREVIEW_ROWS_MIN, PREVIEW_ROWS_MAX, CHAT_PREVIEW_ROWS,
+)
 from data_handler import DataHandler
 from ui_components import (
     apply_dark_theme, 
@@ -11,14 +17,26 @@ from ui_components import (
     render_table_selector,
     render_data_source_info
 )
-from query_processor import QueryProcessor
+from query_processor import QueryProcessor, result_cache
+from result_cache import dataset_version
+from insights import FACETS
+from query_jobs import submit_query
 from visualization import Visualizer
+from model_router import model_router
+from workspace import Workspace
+from dataset_store import dataset_store, DatasetStore
+from tracing import render_prometheus, start_metrics_server
+from chat_history import (
+    compact_response, enforce_memory_cap, delete_spills, purge_stale_spills, result_page, result_pages,
+    previous_result,
+)
 
 # -------------------------
 # Configuration
 # -------------------------
 st.set_page_config(page_title=PAGE_TITLE, layout=PAGE_LAYOUT)
 apply_dark_theme()
+start_metrics_server()  # no-op unless METRICS_PORT is set
 
 # -------------------------
 # Session State Initialization
@@ -29,19 +47,32 @@ if "schema" not in st.session_state:
     st.session_state.schema = ""
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+    purge_stale_spills()
+if "pending_job" not in st.session_state:
+    st.session_state.pending_job = None
+if "last_timings" not in st.session_state:
+    st.session_state.last_timings = []
 if "current_model" not in st.session_state:
     from config import MODEL_PRIORITY
     st.session_state.current_model = MODEL_PRIORITY[0]
 if "data_source_type" not in st.session_state:
     st.session_state.data_source_type = None
-if "db_connection" not in st.session_state:
-    st.session_state.db_connection = None
+if "db_params" not in st.session_state:
+    st.session_state.db_params = None  # connections are leased from the pool per operation
 if "db_type" not in st.session_state:
     st.session_state.db_type = None
 if "current_table" not in st.session_state:
     st.session_state.current_table = None
 if "available_tables" not in st.session_state:
     st.session_state.available_tables = []
+if "table_catalog" not in st.session_state:
+    st.session_state.table_catalog = {}
+if "workspace" not in st.session_state:
+    st.session_state.workspace = Workspace()  # every loaded dataset; the active one is also `df`
+if "loaded_files" not in st.session_state:
+    st.session_state.loaded_files = set()  # uploads already read into the workspace
 
 # -------------------------
 # Initialize Processor
@@ -60,6 +91,42 @@ else:
     st.sidebar.error("✗ GEMINI_API_KEY not found in .env file")
 
 st.sidebar.markdown(f"**Model:** {st.session_state.current_model}")
+with st.sidebar.expander("Model usage"):
+    st.dataframe(pd.DataFrame([
+        {
+            "Model": model,
+            "Requests": usage["requests"],
+            "Errors": usage["errors"],
+            "p50 (s)": round(usage["latency"], 2) if usage["latency"] is not None else None,
+            "Tokens in": usage["prompt_tokens"],
+            "Cached": usage["cached_tokens"],
+            "Tokens out": usage["output_tokens"],
+        }
+        for model, usage in model_router.stats().items() if usage["eligible"] or usage["requests"]
+    ]), hide_index=True, use_container_width=True)
+cache_stats = result_cache.stats()
+st.sidebar.caption(
+    f"Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+    f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB"
+)
+store_stats = dataset_store.stats()
+st.sidebar.caption(
+    f"Shared datasets: {store_stats['datasets']} ({store_stats['bytes'] / 1024 / 1024:.1f} MB), "
+    f"{store_stats['views']} session views"
+)
+compile_stats = QueryProcessor.compile_cache_stats()
+st.sidebar.caption(
+    f"Compiled expressions: {compile_stats['hits']} hits / {compile_stats['misses']} misses"
+)
+with st.sidebar.expander("Last query timing"):
+    if st.session_state.last_timings:
+        for stage, seconds, depth in st.session_state.last_timings:
+            indent = "\u00a0" * 4 * depth
+            st.caption(f"{indent}{stage}: {seconds * 1000:,.0f} ms")
+    else:
+        st.caption("No query yet")
+    st.download_button("Download metrics", render_prometheus(), file_name="datasense_metrics.prom",
+                       mime="text/plain")
 st.sidebar.markdown("---")
 
 # -------------------------
@@ -67,26 +134,34 @@ st.sidebar.markdown("---")
 # -------------------------
 source_type = render_data_source_selector()
 
-# Handle CSV Upload
+# Handle CSV Upload (each file becomes a workspace dataset)
 if source_type == "CSV File":
-    uploaded_file = render_csv_uploader()
+    uploaded_files = render_csv_uploader()
     
-    if uploaded_file:
-        df, error_messages = DataHandler.load_csv(uploaded_file)
+    for uploaded_file in uploaded_files or []:
+        # Uploads stay in the widget across reruns; read each one once
+        if uploaded_file.file_id in st.session_state.loaded_files:
+            continue
+        # Sessions uploading the same file share one read-only copy
+        df, error_messages = dataset_store.get_or_load(
+            DatasetStore.csv_key(uploaded_file.getvalue()),
+            lambda: DataHandler.load_csv(uploaded_file)
+        )
         
         if df is not None and not df.empty:
-            st.session_state.df = df
-            st.session_state.data_source_type = "csv"
-            st.session_state.current_table = uploaded_file.name
-            st.session_state.schema = DataHandler.generate_schema(df, "csv", uploaded_file.name)
+            schema = DataHandler.generate_schema(df, "csv", uploaded_file.name)
+            try:
+                name = st.session_state.workspace.add(uploaded_file.name, df, schema, "csv")
+            except ValueError as e:
+                st.sidebar.error(str(e))
+                continue
+            st.session_state.loaded_files.add(uploaded_file.file_id)
+            st.session_state.workspace_active = name
             
             rows, cols = df.shape
-            st.sidebar.success(f"✓ Loaded {rows:,} rows × {cols} cols")
-            
-            with st.sidebar.expander("Schema"):
-                st.text(st.session_state.schema)
+            st.sidebar.success(f"✓ Loaded {rows:,} rows × {cols} cols as `{name}`")
         else:
-            st.sidebar.error("Failed to read CSV")
+            st.sidebar.error(f"Failed to read {uploaded_file.name}")
             with st.sidebar.expander("Error Details"):
                 for msg in error_messages:
                     st.text(msg)
@@ -104,7 +179,7 @@ elif source_type == "Database Connection":
             else:
                 st.sidebar.error(message)
     
-    # Connect to Database
+    # Connect to Database (reuses the pooled connection verified by Test Connection)
     if connect_btn:
         with st.spinner("Connecting to database..."):
             conn, _, error = DataHandler.load_from_database(db_type, connection_params)
@@ -112,13 +187,17 @@ elif source_type == "Database Connection":
             if error:
                 st.sidebar.error(error)
             else:
-                st.session_state.db_connection = conn
+                try:
+                    # Get available tables with catalog metadata
+                    catalog = DataHandler.get_table_catalog(conn, db_type, connection_params)
+                finally:
+                    DataHandler.release_connection(db_type, connection_params, conn)
+                
+                st.session_state.db_params = connection_params
                 st.session_state.db_type = db_type
                 st.session_state.data_source_type = "database"
-                
-                # Get available tables
-                tables = DataHandler.get_tables(conn, db_type)
-                st.session_state.available_tables = tables
+                st.session_state.table_catalog = catalog
+                st.session_state.available_tables = tables = list(catalog)
                 
                 if tables:
                     st.sidebar.success(f"✓ Connected! Found {len(tables)} tables")
@@ -126,79 +205,344 @@ elif source_type == "Database Connection":
                     st.sidebar.warning("Connected but no tables found")
     
     # Table Selection
-    if st.session_state.db_connection and st.session_state.available_tables:
-        result = render_table_selector(st.session_state.available_tables, st.session_state.db_type)
+    if st.session_state.db_params and st.session_state.available_tables:
+        result = render_table_selector(
+            st.session_state.available_tables,
+            st.session_state.db_type,
+            st.session_state.table_catalog
+        )
         
         if result and result[0]:
-            selected_table, limit = result
-            with st.spinner(f"Loading {selected_table}..."):
-                df, error = DataHandler.load_table(
-                    st.session_state.db_connection, 
-                    selected_table, 
+            selected_table, limit, load_options = result
+            
+            def load_selected_table():
+                conn, _, error = DataHandler.load_from_database(
                     st.session_state.db_type,
-                    limit
+                    st.session_state.db_params
                 )
+                if error:
+                    return None, error
+                try:
+                    return DataHandler.load_table(
+                        conn, 
+                        selected_table, 
+                        st.session_state.db_type,
+                        limit,
+                        **load_options
+                    )
+                finally:
+                    DataHandler.release_connection(
+                        st.session_state.db_type,
+                        st.session_state.db_params,
+                        conn
+                    )
+            
+            with st.spinner(f"Loading {selected_table}..."):
+                if load_options["sample"]:
+                    df, error = load_selected_table()  # every sample is drawn afresh
+                else:
+                    # Sessions loading the same table share one read-only copy for a while
+                    df, error = dataset_store.get_or_load_table(
+                        st.session_state.db_type,
+                        st.session_state.db_params,
+                        selected_table,
+                        load_selected_table,
+                        limit=limit,
+                        watermark=load_options["watermark"]
+                    )
                 
                 if error:
                     st.sidebar.error(error)
                 else:
-                    st.session_state.df = df
-                    st.session_state.current_table = selected_table
-                    st.session_state.schema = DataHandler.generate_schema(
+                    schema = DataHandler.generate_schema(
                         df, 
                         st.session_state.db_type, 
-                        selected_table
+                        selected_table,
+                        st.session_state.table_catalog.get(selected_table)
                     )
-                    
-                    rows, cols = df.shape
-                    st.sidebar.success(f"✓ Loaded {rows:,} rows × {cols} cols")
-                    
-                    with st.sidebar.expander("Schema"):
-                        st.text(st.session_state.schema)
+                    refresh = None
+                    if load_options["watermark"]:
+                        refresh = {
+                            "db_type": st.session_state.db_type,
+                            "params": st.session_state.db_params,
+                            "table": selected_table,
+                            "column": load_options["watermark"],
+                            "max_rows": limit,
+                            "table_info": st.session_state.table_catalog.get(selected_table),
+                        }
+                    try:
+                        name = st.session_state.workspace.add(selected_table, df, schema, st.session_state.db_type,
+                                                              refresh=refresh)
+                    except ValueError as e:
+                        st.sidebar.error(str(e))
+                    else:
+                        st.session_state.workspace_active = name
+                        rows, cols = df.shape
+                        st.sidebar.success(f"✓ Loaded {rows:,} rows × {cols} cols as `{name}`")
 
-# Display Data Source Info
-if st.session_state.df is not None:
+# -------------------------
+# Workspace: every loaded dataset, one of them active
+# -------------------------
+@st.fragment(run_every=REFRESH_INTERVAL)
+def auto_refresh():
+    """Fetch new rows for datasets with auto-refresh on; reruns the app when any arrived"""
+    added = 0
+    for name in st.session_state.workspace.due_for_refresh(REFRESH_INTERVAL):
+        rows, error = st.session_state.workspace.refresh(name)
+        if error:
+            st.caption(f"Refreshing {name} failed: {error}")
+        added += rows
+    if added:
+        st.rerun()
+
+
+workspace = st.session_state.workspace
+if len(workspace):
+    if st.session_state.get("workspace_active") not in workspace:
+        st.session_state.workspace_active = workspace.names()[-1]
+    
+    def describe_dataset(name):
+        rows, cols = workspace.get(name)["df"].shape
+        return f"{name} ({rows:,} × {cols})"
+    
+    active = st.sidebar.selectbox(
+        "Active dataset", workspace.names(), key="workspace_active", format_func=describe_dataset,
+        help="Charts and insights use the active dataset; questions can also join the others by name"
+    )
+    entry = workspace.get(active)
+    st.session_state.df = entry["df"]
+    st.session_state.schema = entry["schema"]
+    st.session_state.current_table = entry["label"]
+    st.session_state.data_source_type = "csv" if entry["source"] == "csv" else "database"
+    
+    # Display Data Source Info
     render_data_source_info(
         st.session_state.data_source_type,
         st.session_state.current_table,
-        {"db_type": st.session_state.db_type} if st.session_state.data_source_type == "database" else None
+        {"db_type": entry["source"]} if st.session_state.data_source_type == "database" else None
     )
+    with st.sidebar.expander("Schema"):
+        st.text(st.session_state.schema)
+    
+    refresh = entry["refresh"]
+    if refresh:
+        col1, col2 = st.sidebar.columns(2)
+        with col1:
+            refresh_now = st.button("Refresh", use_container_width=True,
+                                    help=f"Load rows with {refresh['column']} after the newest loaded one")
+        with col2:
+            refresh["auto"] = st.toggle("Auto-refresh", value=refresh["auto"], key=f"auto_refresh_{active}",
+                                        help=f"Check for new rows every {REFRESH_INTERVAL}s")
+        if refresh_now:
+            with st.spinner(f"Refreshing {active}..."):
+                added, error = workspace.refresh(active)
+            if error:
+                st.sidebar.error(error)
+            elif added:
+                st.rerun()
+            else:
+                st.sidebar.info("No new rows")
+        st.sidebar.caption(f"Newest {refresh['column']}: {refresh['watermark']} · last refresh added {refresh['added']:,} rows")
+    if workspace.due_for_refresh(0):  # any dataset with auto-refresh on
+        with st.sidebar:
+            auto_refresh()
+    if len(workspace) > 1 and st.sidebar.button(f"Remove {active}"):
+        workspace.remove(active)
+        st.rerun()
 
 # Clear Data Button
 if st.session_state.df is not None:
     if st.sidebar.button("Clear Data & Reset"):
         st.session_state.df = None
         st.session_state.schema = ""
+        st.session_state.workspace.clear()
+        if st.session_state.pending_job:
+            st.session_state.pending_job.cancel()
+            st.session_state.pending_job = None
+        delete_spills(st.session_state.messages)
         st.session_state.messages = []
         st.session_state.data_source_type = None
         st.session_state.current_table = None
         
-        # Close database connections properly
-        if st.session_state.db_connection:
-            try:
-                if st.session_state.db_type == "MongoDB":
-                    st.session_state.db_connection['client'].close()
-                elif st.session_state.db_type == "Redis":
-                    st.session_state.db_connection['client'].close()
-                elif st.session_state.db_type == "Cassandra":
-                    st.session_state.db_connection['cluster'].shutdown()
-                elif st.session_state.db_type in ["PostgreSQL", "MySQL", "SQLite", "SQL Server"]:
-                    st.session_state.db_connection.close()
-            except:
-                pass
-        
-        st.session_state.db_connection = None
+        # Pooled connections stay open for other sessions until their idle timeout
+        st.session_state.db_params = None
         st.session_state.db_type = None
         st.session_state.available_tables = []
+        st.session_state.table_catalog = {}
         st.rerun()
 
+# -------------------------
+# Background Chat Queries
+# -------------------------
+def finish_pending_query(job):
+    """Move a finished (or stopped) job's response into the chat history"""
+    response = job.result()
+    model = response.pop("model", None)
+    st.session_state.last_timings = response.pop("timings", [])
+    if model:
+        st.session_state.current_model = model
+    response = compact_response(response, st.session_state.session_id)
+    st.session_state.messages.append({"role": "assistant", "content": response})
+    enforce_memory_cap(st.session_state.messages, st.session_state.session_id)
+    st.session_state.pending_job = None
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_pending_query():
+    """Poll the running chat query without blocking the rest of the page"""
+    job = st.session_state.pending_job
+    if job is None:
+        return
+    
+    if job.poll() == "running":
+        col1, col2 = st.columns([6, 1])
+        with col1:
+            st.markdown(f'<div class="bot-message">{job.stage}... ({job.elapsed:.0f}s)</div>', unsafe_allow_html=True)
+        with col2:
+            if st.button("Cancel", key=f"cancel_{job.id}", use_container_width=True):
+                job.cancel()
+            else:
+                return
+    
+    finish_pending_query(job)
+    st.rerun()
+
+@st.fragment
+def render_result_pages(content):
+    """A large chat result one page at a time, sorted and paged server-side; reruns only this fragment"""
+    result_id = os.path.splitext(os.path.basename(content["spill_path"]))[0]
+    columns = list(content["content"].columns)
+    total_rows = content.get("total_rows", len(content["content"]))
+    col1, col2, col3 = st.columns([3, 1, 2])
+    with col1:
+        sort_by = st.selectbox("Sort by", [None, *range(len(columns))], key=f"sort_{result_id}",
+                               format_func=lambda i: "Result order" if i is None else str(columns[i]))
+    with col2:
+        descending = st.toggle("Descending", key=f"desc_{result_id}", disabled=sort_by is None)
+    with col3:
+        page = st.number_input("Page", min_value=1, max_value=result_pages(content), key=f"page_{result_id}")
+
+    try:
+        rows = result_page(content, page - 1, sort_by, descending)
+    except OSError:
+        st.caption("The full result is no longer available; showing the rows kept in memory")
+        st.dataframe(content["content"], use_container_width=True)
+        return
+    st.dataframe(rows, use_container_width=True)
+    first = (page - 1) * CHAT_PREVIEW_ROWS
+    st.caption(f"Rows {first + 1:,}-{first + len(rows):,} of {total_rows:,}")
+
+# -------------------------
+# Dashboard & Analytics
+# -------------------------
+# With state tracking only the selected tab's body runs; older Streamlit runs every tab
+LAZY_TABS = "on_change" in inspect.signature(st.tabs).parameters
+
+
+def tab_open(tab):
+    """Whether a tab's body should run on this rerun"""
+    return getattr(tab, "open", None) is not False
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def dataset_overview(version, _df):
+    """Missing/duplicate counts and describe(), computed once per dataset version"""
+    try:
+        duplicates = int(_df.duplicated().sum())
+    except TypeError:
+        duplicates = None  # unhashable cells
+    return int(_df.isnull().sum().sum()), duplicates, _df.describe()
+
+
+@st.fragment
+def render_dashboard(df):
+    """Dashboard tab; its widgets rerun only this fragment"""
+    visualizer = Visualizer(df)
+    missing, duplicates, _ = dataset_overview(dataset_version(df), df)
+    
+    st.markdown("### Data Overview")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Rows", f"{len(df):,}")
+    with col2:
+        st.metric("Total Columns", len(df.columns))
+    with col3:
+        st.metric("Missing Values", f"{missing:,}")
+    with col4:
+        st.metric("Duplicate Rows", f"{duplicates:,}" if duplicates is not None else "n/a")
+    
+    st.markdown("---")
+    
+    st.markdown("### Data Preview")
+    preview_rows = st.slider("Rows to display", PREVIEW_ROWS_MIN, PREVIEW_ROWS_MAX, PREVIEW_ROWS_DEFAULT)
+    st.dataframe(df.head(preview_rows), use_container_width=True)
+    
+    st.markdown("---")
+    
+    st.markdown("### Chart Builder")
+    visualizer.render_chart_builder()
+    
+    st.markdown("---")
+    
+    st.markdown("### Export Data")
+    csv = df.to_csv(index=False).encode('utf-8')
+    st.download_button(
+        label="Download as CSV",
+        data=csv,
+        file_name=f"datasense_export_{st.session_state.current_table or 'data'}.csv",
+        mime="text/csv"
+    )
+
+
+@st.fragment
+def render_analytics(df):
+    """Analytics tab; its widgets rerun only this fragment"""
+    visualizer = Visualizer(df)
+    _, _, describe = dataset_overview(dataset_version(df), df)
+    
+    st.markdown("### Statistical Summary")
+    st.dataframe(describe, use_container_width=True)
+    
+    st.markdown("---")
+    
+    st.markdown("### Missing Values Analysis")
+    visualizer.render_missing_values_analysis()
+    
+    st.markdown("---")
+    
+    st.markdown("### Correlation Analysis")
+    visualizer.render_correlation_analysis()
+    
+    st.markdown("---")
+    
+    st.markdown("### Distribution Analysis")
+    visualizer.render_distribution_analysis()
+    
+    st.markdown("---")
+    
+    st.markdown("### AI-Generated Insights")
+    if st.button("Generate Insights"):
+        if not GEMINI_API_KEY:
+            st.error("API key not configured")
+        else:
+            # Facets run concurrently; each is rendered as soon as it completes
+            placeholders = {facet: st.empty() for facet in FACETS}
+            for facet, title in FACETS.items():
+                placeholders[facet].markdown(f'<div class="bot-message"><b>{title}</b>: analyzing...</div>', unsafe_allow_html=True)
+            for facet, title, insights in query_processor.generate_insights_stream(df, st.session_state.schema):
+                placeholders[facet].markdown(f'<div class="bot-message"><b>{title}</b>\n\n{insights}</div>', unsafe_allow_html=True)
+
 # -------------------------
 # Main Content
 # -------------------------
 if st.session_state.df is None:
     st.info("Please select a data source from the sidebar to get started")
 else:
-    tab1, tab2, tab3 = st.tabs(["Chat", "Dashboard", "Analytics"])
+    if LAZY_TABS:
+        tab1, tab2, tab3 = st.tabs(["Chat", "Dashboard", "Analytics"], key="main_tab", on_change="rerun")
+    else:
+        tab1, tab2, tab3 = st.tabs(["Chat", "Dashboard", "Analytics"])
     
     # -------------------------
     # TAB 1: CHAT
@@ -215,17 +559,24 @@ else:
                             st.markdown(f'<div class="user-message">{msg["content"]}</div>', unsafe_allow_html=True)
                         with col2:
                             if st.button("Delete", key=f"del_user_{idx}", help="Delete this message"):
-                                if idx + 1 < len(st.session_state.messages):
-                                    del st.session_state.messages[idx:idx+2]
-                                else:
-                                    del st.session_state.messages[idx]
+                                end = idx + 2 if idx + 1 < len(st.session_state.messages) else idx + 1
+                                delete_spills(st.session_state.messages[idx:end])
+                                del st.session_state.messages[idx:end]
                                 st.rerun()
                     else:
                         content = msg["content"]
                         if isinstance(content, dict):
                             if content.get("type") == "dataframe":
                                 st.markdown('<div class="bot-message">Query Result:</div>', unsafe_allow_html=True)
-                                st.dataframe(content["content"], use_container_width=True)
+                                if content.get("spill_path"):
+                                    render_result_pages(content)
+                                else:
+                                    st.dataframe(content["content"], use_container_width=True)
+                                if content.get("note"):
+                                    st.warning(content["note"])
+                                if content.get("summary") is not None:
+                                    with st.expander("Summary of all rows"):
+                                        st.dataframe(content["summary"], use_container_width=True)
                                 if content.get("explain"):
                                     st.markdown(f'<div class="bot-message">{content["explain"]}</div>', unsafe_allow_html=True)
                                 if content.get("code"):
@@ -255,103 +606,46 @@ Examples:
             user_input = st.text_input("Ask a question...", key="user_input", label_visibility="collapsed", 
                                       placeholder="e.g., Show top 5 rows sorted by revenue")
         with col2:
-            send_button = st.button("Send", use_container_width=True, type="primary")
+            send_button = st.button("Send", use_container_width=True, type="primary",
+                                    disabled=st.session_state.pending_job is not None)
 
         if send_button and user_input:
+            # The last table answer, for follow-ups that refine it instead of rescanning the dataset
+            prev = previous_result(st.session_state.messages)
             st.session_state.messages.append({"role": "user", "content": user_input})
-            
-            with st.spinner("Thinking..."):
-                response = query_processor.process_query(
-                    user_input,
-                    st.session_state.df,
-                    st.session_state.schema,
-                    st.session_state.current_model
-                )
-            
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            # Runs on the shared worker pool; the fragment below polls it
+            st.session_state.pending_job = submit_query(
+                query_processor,
+                user_input,
+                st.session_state.df,
+                st.session_state.schema,
+                st.session_state.current_model,
+                tables=st.session_state.workspace.tables(exclude=st.session_state.get("workspace_active")),
+                prev=prev
+            )
             st.rerun()
         
+        render_pending_query()
+        
         if st.session_state.messages:
             if st.button("Clear Chat"):
+                if st.session_state.pending_job:
+                    st.session_state.pending_job.cancel()
+                    st.session_state.pending_job = None
+                delete_spills(st.session_state.messages)
                 st.session_state.messages = []
                 st.rerun()
     
     # -------------------------
     # TAB 2: DASHBOARD
     # -------------------------
-    with tab2:
-        df = st.session_state.df
-        visualizer = Visualizer(df)
-        
-        st.markdown("### Data Overview")
-        
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Total Rows", f"{len(df):,}")
-        with col2:
-            st.metric("Total Columns", len(df.columns))
-        with col3:
-            missing = df.isnull().sum().sum()
-            st.metric("Missing Values", f"{missing:,}")
-        with col4:
-            duplicates = df.duplicated().sum()
-            st.metric("Duplicate Rows", f"{duplicates:,}")
-        
-        st.markdown("---")
-        
-        st.markdown("### Data Preview")
-        from config import PREVIEW_ROWS_DEFAULT, PREVIEW_ROWS_MIN, PREVIEW_ROWS_MAX
-        preview_rows = st.slider("Rows to display", PREVIEW_ROWS_MIN, PREVIEW_ROWS_MAX, PREVIEW_ROWS_DEFAULT)
-        st.dataframe(df.head(preview_rows), use_container_width=True)
-        
-        st.markdown("---")
-        
-        st.markdown("### Chart Builder")
-        visualizer.render_chart_builder()
-        
-        st.markdown("---")
-        
-        st.markdown("### Export Data")
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Download as CSV",
-            data=csv,
-            file_name=f"datasense_export_{st.session_state.current_table or 'data'}.csv",
-            mime="text/csv"
-        )
+    if tab_open(tab2):
+        with tab2:
+            render_dashboard(st.session_state.df)
     
     # -------------------------
     # TAB 3: ANALYTICS
     # -------------------------
-    with tab3:
-        df = st.session_state.df
-        visualizer = Visualizer(df)
-        
-        st.markdown("### Statistical Summary")
-        st.dataframe(df.describe(), use_container_width=True)
-        
-        st.markdown("---")
-        
-        st.markdown("### Missing Values Analysis")
-        visualizer.render_missing_values_analysis()
-        
-        st.markdown("---")
-        
-        st.markdown("### Correlation Analysis")
-        visualizer.render_correlation_analysis()
-        
-        st.markdown("---")
-        
-        st.markdown("### Distribution Analysis")
-        visualizer.render_distribution_analysis()
-        
-        st.markdown("---")
-        
-        st.markdown("### AI-Generated Insights")
-        if st.button("Generate Insights"):
-            if not GEMINI_API_KEY:
-                st.error("API key not configured")
-            else:
-                with st.spinner(" Analyzing data..."):
-                    insights = query_processor.generate_insights(df, st.session_state.schema)
-                    st.markdown(f'<div class="bot-message">{insights}</div>', unsafe_allow_html=True)
\ No newline at end of file
+    if tab_open(tab3):
+        with tab3:
+            render_analytics(st.session_state.df)
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import gemini_api
+from config import BATCH_WORKERS, BATCH_RESULT_ROWS, API_REQUESTS_PER_MINUTE
+from data_handler import DataHandler
+from query_processor import QueryProcessor
+
+# Question fields that describe the dataset rather than being passed through to the output
+SOURCE_FIELDS = ("csv", "db_type", "connection", "table", "limit")
+
+
+def read_questions(path, defaults):
+    """Questions from a JSONL file (one object per line) or a text file (one question per line).
+
+    JSONL entries may name their own dataset with "csv", or "db_type" +
+    "connection" + "table"; otherwise the command-line dataset is used.
+    """
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"question": line}
+            if "question" not in entry:
+                raise ValueError(f"{path}:{number}: missing \"question\"")
+            entry.setdefault("id", number)
+            # Entries naming their own dataset don't mix in parts of the default one
+            inherited = ("limit",) if "csv" in entry or "db_type" in entry else SOURCE_FIELDS
+            for field in inherited:
+                if field not in entry and defaults.get(field) is not None:
+                    entry[field] = defaults[field]
+            questions.append(entry)
+    return questions
+
+
+def source_key(entry):
+    return json.dumps({field: entry.get(field) for field in SOURCE_FIELDS}, sort_keys=True)
+
+
+def load_dataset(entry):
+    """Load the dataset a question refers to; returns (df, schema, error)"""
+    if entry.get("csv"):
+        try:
+            with open(entry["csv"], "rb") as f:
+                df, errors = DataHandler.load_csv(f)
+        except OSError as e:
+            return None, None, f"Cannot open CSV: {str(e)}"
+        if df is None:
+            return None, None, "; ".join(errors) or "Failed to read CSV"
+        return df, DataHandler.generate_schema(df, "csv", os.path.basename(entry["csv"])), None
+
+    db_type, params, table = entry.get("db_type"), entry.get("connection") or {}, entry.get("table")
+    if not (db_type and table):
+        return None, None, "No dataset: give a csv, or db_type, connection and table"
+    conn, _, error = DataHandler.load_from_database(db_type, params)
+    if error:
+        return None, None, error
+    broken = False
+    try:
+        catalog = DataHandler.get_table_catalog(conn, db_type, params)
+        table_info = catalog.get(table)
+        limit = entry.get("limit") or DataHandler.rows_for_budget(table_info)
+        df, error = DataHandler.load_table(conn, table, db_type, limit=limit)
+    except Exception as e:
+        broken = True
+        return None, None, f"Error loading table: {str(e)}"
+    finally:
+        DataHandler.release_connection(db_type, params, conn, broken=broken)
+    if error:
+        return None, None, error
+    return df, DataHandler.generate_schema(df, db_type, table, table_info), None
+
+
+class DatasetCache:
+    """Load each distinct dataset once, even when several workers ask for it at the same time"""
+
+    def __init__(self):
+        self._datasets = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, entry):
+        key = source_key(entry)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._datasets:
+                start = time.perf_counter()
+                df, schema, error = load_dataset(entry)
+                self._datasets[key] = (df, schema, error, time.perf_counter() - start)
+            return self._datasets[key]
+
+
+def _serialize(response, max_rows):
+    """JSON-friendly copy of a process_query response"""
+    result = {"type": response.get("type"), "model": response.get("model")}
+    content = response.get("content")
+    if isinstance(content, pd.DataFrame):
+        result["shape"] = list(content.shape)
+        result["columns"] = [str(c) for c in content.columns]
+        result["content"] = json.loads(content.head(max_rows).to_json(orient="records", date_format="iso"))
+    else:
+        result["content"] = content
+    for field in ("code", "explain", "note"):
+        if response.get(field):
+            result[field] = response[field]
+    if isinstance(response.get("summary"), pd.DataFrame):
+        result["summary"] = json.loads(response["summary"].to_json(date_format="iso"))
+    result["timings"] = {stage: round(seconds, 6) for stage, seconds, depth in response.get("timings", [])
+                         if depth <= 1}
+    return result
+
+
+def run_question(processor, datasets, entry, max_rows):
+    """Answer one question; returns the output record"""
+    record = {k: v for k, v in entry.items() if k != "connection"}  # may hold credentials
+    start = time.perf_counter()
+    df, schema, error, load_seconds = datasets.get(entry)
+    if error:
+        record.update(type="error", content=error)
+    else:
+        try:
+            response = processor.process_query(entry["question"], df, schema, None)
+            record.update(_serialize(response, max_rows))
+        except Exception as e:
+            record.update(type="error", content=f"Error: {str(e)}")
+    record["seconds"] = round(time.perf_counter() - start, 6)
+    record["dataset_load_seconds"] = round(load_seconds, 6)
+    return record
+
+
+def run_batch(questions, output, workers=BATCH_WORKERS, max_rows=BATCH_RESULT_ROWS):
+    """Answer questions on a bounded thread pool, writing JSONL records as they finish.
+
+    Returns a summary dict with counts per response type and total seconds.
+    """
+    processor = QueryProcessor()
+    datasets = DatasetCache()
+    summary = {"questions": len(questions), "types": {}}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="datasense-batch") as executor:
+        futures = [executor.submit(run_question, processor, datasets, entry, max_rows) for entry in questions]
+        for future in as_completed(futures):
+            record = future.result()
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+            summary["types"][record["type"]] = summary["types"].get(record["type"], 0) + 1
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a file of questions without the Streamlit UI.")
+    parser.add_argument("questions", help="JSONL (one object with \"question\" per line) or plain text file")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file (default: stdout)")
+    parser.add_argument("--csv", help="default dataset: CSV file")
+    parser.add_argument("--sqlite", help="default dataset: SQLite database file (use with --table)")
+    parser.add_argument("--table", help="default table for --sqlite")
+    parser.add_argument("--limit", type=int, help="rows to load per table (default: memory budget)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--rpm", type=int, default=API_REQUESTS_PER_MINUTE,
+                        help="max API requests per minute across workers (0 = unlimited)")
+    parser.add_argument("--max-rows", type=int, default=BATCH_RESULT_ROWS, help="result rows written per answer")
+    args = parser.parse_args(argv)
+
+    defaults = {"csv": args.csv, "table": args.table, "limit": args.limit}
+    if args.sqlite:
+        defaults.update(db_type="SQLite", connection={"database": args.sqlite})
+    questions = read_questions(args.questions, defaults)
+    gemini_api.set_rate_limit(args.rpm)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        summary = run_batch(questions, output, workers=args.workers, max_rows=args.max_rows)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary["types"].get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
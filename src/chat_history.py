@@ -0,0 +1,211 @@
+import os
+import shutil
+import time
+import uuid
+
+import pandas as pd
+
+from config import (
+    CHAT_PREVIEW_ROWS,
+    CHAT_SESSION_MEMORY_MB,
+    CHAT_SPILL_DIR,
+    CHAT_SPILL_MAX_AGE_HOURS,
+    CHAT_PAGE_CACHE_MB,
+)
+from result_cache import ResultCache, assign_version, estimate_size
+
+# Full results of spilled chat results, their sort orders while paged through, and recent
+# results prepared for follow-up questions; shared across sessions
+_page_cache = ResultCache(max_bytes=CHAT_PAGE_CACHE_MB * 1024 * 1024)
+
+
+def session_spill_dir(session_id):
+    """Directory holding spilled results for one session"""
+    return os.path.join(CHAT_SPILL_DIR, session_id)
+
+
+def _write_spill(df, directory):
+    """Write a result to a columnar file, falling back to pickle without pyarrow"""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, uuid.uuid4().hex)
+    # Parquet needs string column names; the shallow copy leaves the cached result untouched
+    frame = df.copy(deep=False)
+    frame.columns = [str(c) for c in frame.columns]
+    try:
+        frame.to_parquet(base + ".parquet")
+        return base + ".parquet"
+    except Exception:
+        # No pyarrow, or mixed-type object columns Arrow can't represent
+        if os.path.exists(base + ".parquet"):
+            os.remove(base + ".parquet")
+        df.to_pickle(base + ".pkl")
+        return base + ".pkl"
+
+
+def load_full_result(content):
+    """Rehydrate the full result of a compacted chat entry"""
+    path = content.get("spill_path")
+    if not path:
+        return content["content"]
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def result_pages(content, page_size=CHAT_PREVIEW_ROWS):
+    """Number of pages of a chat result"""
+    total_rows = content.get("total_rows", len(content["content"]))
+    return max(1, -(-total_rows // page_size))
+
+
+def result_page(content, page, sort_by=None, descending=False, page_size=CHAT_PREVIEW_ROWS):
+    """Rows of one page (0-based) of a chat result, optionally sorted by a column position.
+
+    Paging and sorting run here against the full result (rehydrated once and
+    cached with its sort orders), so only the page is sent to the browser.
+    The unsorted pages held in memory need no rehydration.
+    """
+    _mark_in_use(content)
+    start = page * page_size
+    preview = content["content"]
+    if sort_by is None and start + page_size <= len(preview):
+        return preview.iloc[start:start + page_size]
+    df = full_result(content)
+    if sort_by is None:
+        return df.iloc[start:start + page_size]
+    order = _page_cache.get_or_compute(("order", content.get("spill_path"), sort_by, descending),
+                                       lambda: _sort_order(df.iloc[:, sort_by], descending))
+    return df.iloc[order[start:start + page_size]]
+
+
+def full_result(content):
+    """Full result of a chat entry; a spilled one is rehydrated once into the shared cache"""
+    path = content.get("spill_path")
+    if not path:
+        return content["content"]
+    _mark_in_use(content)
+    return _page_cache.get_or_compute(("result", path), lambda: load_full_result(content))
+
+
+def _mark_in_use(content):
+    """Touch a spilled result's session directory, so purge_stale_spills keeps a live session's spills"""
+    if content.get("spill_path"):
+        try:
+            os.utime(os.path.dirname(content["spill_path"]))
+        except OSError:
+            pass
+
+
+def previous_result(messages):
+    """(question, result) of the latest table answer, for follow-up questions to query as `prev`.
+
+    The result is a dataset of its own: group keys held in the index become
+    columns (so SQL sees them too) and it keeps the version its chat entry
+    was given, so every follow-up on it shares cache entries and the
+    sandbox's copy. None when there is no such answer, the latest one was
+    truncated (the note says so; querying its rows would silently answer
+    from part of the result, so follow-ups query df again) or it can't be read.
+    """
+    for i in range(len(messages) - 1, -1, -1):
+        content = messages[i]["content"]
+        if isinstance(content, dict) and content.get("type") == "dataframe":
+            if content.get("note"):
+                return None
+            question = messages[i - 1]["content"] if i else ""
+            version = content["version"]
+            try:
+                prev = _page_cache.get_or_compute(("prev", version),
+                                                  lambda: _as_dataset(full_result(content), version))
+            except OSError:
+                return None
+            return question, prev
+    return None
+
+
+def _as_dataset(df, version):
+    if any(name is not None for name in df.index.names) and not set(df.index.names) & set(df.columns):
+        df = df.reset_index()
+    else:
+        df = df.copy(deep=False)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ["_".join(str(part) for part in col if str(part)) for col in df.columns]
+    else:
+        df.columns = [str(c) for c in df.columns]
+    df.attrs = {}
+    assign_version(df, version)
+    return df
+
+
+def _sort_order(column, descending):
+    """Row positions of column in sorted order, nulls last; mixed types sort as text"""
+    column = column.reset_index(drop=True)
+    try:
+        ordered = column.sort_values(ascending=not descending, kind="stable", na_position="last")
+    except TypeError:
+        ordered = column.sort_values(ascending=not descending, kind="stable", na_position="last",
+                                     key=lambda c: c.astype(str))
+    return ordered.index.to_numpy(copy=True)
+
+
+def compact_response(response, session_id):
+    """Keep a bounded preview of a dataframe response, spilling the full result to disk.
+
+    The result is registered as a dataset version of its own, recorded in the
+    entry so its previews and spill keep it, for querying it as `prev`. Its
+    attrs (the queried dataset's, e.g. its SQLite source) are dropped.
+    """
+    if not isinstance(response, dict) or response.get("type") != "dataframe":
+        return response
+    df = response["content"].copy(deep=False)
+    df.attrs = {}
+    compact = dict(response, content=df, total_rows=len(df), spill_path=None, version=assign_version(df))
+    if len(df) > CHAT_PREVIEW_ROWS:
+        compact["spill_path"] = _write_spill(df, session_spill_dir(session_id))
+        compact["content"] = df.head(CHAT_PREVIEW_ROWS)
+    return compact
+
+
+def enforce_memory_cap(messages, session_id, cap_bytes=CHAT_SESSION_MEMORY_MB * 1024 * 1024):
+    """Spill the oldest in-memory results until the session's history fits the cap"""
+    frames = [
+        msg["content"] for msg in messages
+        if isinstance(msg.get("content"), dict) and msg["content"].get("type") == "dataframe"
+    ]
+    total = sum(estimate_size(c["content"]) for c in frames)
+    for content in frames:
+        if total <= cap_bytes:
+            break
+        before = estimate_size(content["content"])
+        if not content.get("spill_path"):
+            content["spill_path"] = _write_spill(content["content"], session_spill_dir(session_id))
+        content["content"] = content["content"].head(min(CHAT_PREVIEW_ROWS, 20))
+        total -= before - estimate_size(content["content"])
+
+
+def delete_spills(messages):
+    """Remove spill files referenced by the given history entries"""
+    for msg in messages:
+        content = msg.get("content")
+        if isinstance(content, dict) and content.get("spill_path"):
+            try:
+                os.remove(content["spill_path"])
+            except OSError:
+                pass
+
+
+def purge_stale_spills(max_age_hours=CHAT_SPILL_MAX_AGE_HOURS):
+    """Remove spill directories of sessions that have been idle for too long.
+
+    A directory's mtime is its session's last use: spilling a result or
+    showing or reading a spilled one touches it.
+    """
+    if not os.path.isdir(CHAT_SPILL_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(CHAT_SPILL_DIR):
+        path = os.path.join(CHAT_SPILL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
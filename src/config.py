@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,6 +12,50 @@ MODEL_PRIORITY = [
     "gemini-2.0-flash",
     "gemini-2.0-flash-001",
 ]
+API_REQUESTS_PER_MINUTE = int(os.getenv("API_REQUESTS_PER_MINUTE", "0"))  # 0 = unlimited
+
+# Model Routing Configuration
+MODEL_QUALITY = {  # relative answer quality; models below the floor are skipped while any model meets it
+    "gemini-2.5-flash": 3,
+    "gemini-2.0-flash": 2,
+    "gemini-2.0-flash-001": 2,
+}
+ROUTER_QUALITY_FLOOR = int(os.getenv("ROUTER_QUALITY_FLOOR", "2"))
+ROUTER_LATENCY_WEIGHT = 1.0  # score per second of median latency
+ROUTER_ERROR_WEIGHT = 10.0  # score per unit error rate (10% errors = 1s of latency)
+ROUTER_WINDOW = 50  # recent requests kept per model
+ROUTER_WINDOW_SECONDS = 600  # older outcomes are forgotten, so slow models get re-tried
+
+# Prompt Configuration
+PROMPT_TOKEN_BUDGET = 1500  # per-question context (relevant columns, samples, question)
+PROMPT_PREFIX_TOKEN_BUDGET = 3000  # static per-dataset prefix (instructions, schema, examples)
+PROMPT_CACHE_MIN_TOKENS = 1024  # smallest prefix worth an API context cache
+PROMPT_CACHE_TTL = 600  # seconds
+
+# Background Query Configuration
+QUERY_WORKERS = 8  # worker threads shared by all sessions
+QUERY_TIMEOUT = 120  # wall-clock seconds before a chat query is abandoned
+JOB_POLL_INTERVAL = 0.5  # seconds between status refreshes of a running query
+
+# Sandbox Configuration (process pool for model-generated pandas/SQL)
+SANDBOX_ENABLED = True
+SANDBOX_WORKERS = min(4, os.cpu_count() or 2)
+SANDBOX_MEMORY_MB = 2048  # RSS limit per worker; the worker is killed above it
+SANDBOX_CPU_SECONDS = 60  # CPU time per job
+SANDBOX_DATA_DIR = os.path.join(tempfile.gettempdir(), "datasense_data")
+SANDBOX_MAX_DATASET_FILES = 8  # memory-mapped dataset files kept on disk
+
+# Workspace Configuration (several datasets per session, joinable in pandas and SQL)
+WORKSPACE_MAX_DATASETS = 8  # datasets one session can hold side by side
+SQL_ENGINE_MAX_TABLES = 8  # datasets kept loaded in the in-process SQL engine (sandbox disabled)
+SQLITE_MMAP_MB = 256  # memory-map SQLite files queried in place up to this size (0 disables)
+
+# Shared Dataset Store Configuration (one copy of each loaded dataset per process)
+DATASET_STORE_IDLE_MB = 512  # datasets no session uses are kept, least recently used first out, up to this size
+DATASET_STORE_DB_MAX_AGE = 300  # seconds a database load is reused by other sessions before it is reloaded
+
+# Insights Configuration
+INSIGHT_WORKERS = 4  # concurrent facet requests (quality, distributions, correlations, outliers)
 
 # Streamlit Configuration
 PAGE_TITLE = "DataSense"
@@ -22,6 +67,46 @@ SUPPORTED_NOSQL_DB_TYPES = ["MongoDB", "Redis", "Cassandra"]
 SUPPORTED_DB_TYPES = SUPPORTED_SQL_DB_TYPES + SUPPORTED_NOSQL_DB_TYPES
 DEFAULT_DB_TYPE = "PostgreSQL"
 
+# Connection Pool Configuration
+POOL_MAX_SIZE = 5  # connections per distinct set of connection parameters
+POOL_IDLE_TIMEOUT = 300  # seconds before an idle connection is closed
+POOL_CHECKOUT_TIMEOUT = 10  # seconds to wait when the pool is exhausted
+CATALOG_CACHE_TTL = 300  # seconds table/column metadata is cached per connection
+
+# Table Load Configuration
+LOAD_MEMORY_BUDGET_MB = 200  # approximate in-memory size of a loaded table
+LOAD_MIN_ROWS = 1000
+LOAD_MAX_ROWS = 1_000_000
+REFRESH_INTERVAL = 60  # seconds between automatic incremental refreshes of "Newest rows" tables
+
+# Query Result Cache Configuration
+RESULT_CACHE_MAX_MB = 256  # total size of cached pandas/SQL results across sessions
+COMPILED_CACHE_SIZE = 512  # validated, compiled pandas expressions kept per process
+FASTPATH_MIN_ROWS = 100_000  # route numeric filters/arithmetic through numexpr above this size
+
+# Result Guardrail Configuration (cap what one answer can materialize)
+RESULT_MAX_ROWS = 500_000  # rows kept of a result; SQL stops fetching here, pandas results are cut
+RESULT_MAX_MB = 200  # approximate in-memory size kept of a result
+RESULT_PROBE_ROWS = 200  # input rows a row-multiplying pandas expression (merge, explode...) is tried on first
+RESULT_MAX_GROWTH = 10  # rows out per row in beyond which an over-budget expression isn't run in full
+
+# Chat History Configuration
+CHAT_PREVIEW_ROWS = 200  # rows of each result kept in memory and rendered inline
+CHAT_SESSION_MEMORY_MB = 50  # cap on in-memory results per session before spilling
+CHAT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "datasense_spill")
+CHAT_SPILL_MAX_AGE_HOURS = 24
+CHAT_PAGE_CACHE_MB = 256  # spilled results (and their sort orders) kept in memory while paged through
+
+# Batch Mode Configuration
+BATCH_WORKERS = 4  # questions answered concurrently by `python src/batch.py`
+BATCH_RESULT_ROWS = 20  # rows of each dataframe result written to the JSONL output
+
+# Metrics Configuration
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Prometheus /metrics endpoint; 0 disables
+METRICS_FILE = os.getenv("METRICS_FILE", "")  # Prometheus text file rewritten after queries; "" disables
+METRICS_FILE_INTERVAL = 5  # minimum seconds between metrics file rewrites
+
 # CSV Configuration
 SUPPORTED_FILE_TYPES = ["csv"]
 CSV_ENCODINGS = ["utf-8", "latin-1", "iso-8859-1"]
@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """Process-wide pool of database connections keyed by connection parameters.
+
+    Exclusive connections (DB-API handles) are checked out by one borrower at a
+    time and reset (rolled back) when returned, so a reused connection never
+    sits in an old transaction or snapshot. Shared clients (MongoDB, Redis, Cassandra) are thread-safe and pool
+    internally, so a single client per key is handed to every borrower.
+    """
+
+    def __init__(self, connect, ping, close, reset=None, max_size=5, idle_timeout=300,
+                 checkout_timeout=10, shared_types=()):
+        self._connect = connect
+        self._ping = ping
+        self._close = close
+        self._reset = reset
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.shared_types = set(shared_types)
+        self._slots = {}
+        self._lock = threading.Condition()
+
+    @staticmethod
+    def make_key(db_type, connection_params):
+        """Build a hashable pool key from connection parameters"""
+        return (db_type, tuple(sorted((k, str(v)) for k, v in connection_params.items())))
+
+    def _slot(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = {"idle": deque(), "in_use": 0, "shared": None, "shared_refs": 0, "connecting": False,
+                    "last_used": 0.0}
+            self._slots[key] = slot
+        return slot
+
+    def acquire(self, db_type, connection_params):
+        """Check out a live connection, reusing an idle one when possible.
+
+        Connecting, pinging and closing happen outside the pool lock: a slot
+        is reserved under the lock first, so one slow host never blocks
+        checkouts for other databases.
+        """
+        key = self.make_key(db_type, connection_params)
+
+        if db_type in self.shared_types:
+            return self._acquire_shared(key, db_type, connection_params)
+
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            conn = None
+            with self._lock:
+                stale = self._prune_locked()
+                slot = self._slot(key)
+                while not slot["idle"] and slot["in_use"] >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._close_each(stale)
+                        raise TimeoutError(f"Connection pool exhausted ({self.max_size} connections in use)")
+                    self._lock.wait(remaining)
+                if slot["idle"]:
+                    conn, _ = slot["idle"].pop()
+                slot["in_use"] += 1
+            self._close_each(stale)
+
+            try:
+                if conn is None:
+                    return self._connect(db_type, connection_params)
+                if self._is_alive(db_type, conn):
+                    return conn
+                self._safe_close(db_type, conn)
+            except Exception:
+                self._unreserve(slot)
+                raise
+            self._unreserve(slot)  # dead idle connection; try the next one
+
+    def _unreserve(self, slot):
+        with self._lock:
+            slot["in_use"] -= 1
+            self._lock.notify()
+
+    def _acquire_shared(self, key, db_type, connection_params):
+        while True:
+            with self._lock:
+                stale = self._prune_locked()
+                slot = self._slot(key)
+                # One borrower connects; the others wait for it to succeed or fail
+                while slot["connecting"]:
+                    self._lock.wait()
+                conn = slot["shared"]
+                if conn is not None:
+                    slot["shared_refs"] += 1
+                else:
+                    slot["connecting"] = True
+            self._close_each(stale)
+
+            if conn is not None:
+                if self._is_alive(db_type, conn):
+                    return conn
+                with self._lock:
+                    slot["shared_refs"] -= 1
+                    if slot["shared"] is conn:
+                        slot["shared"] = None
+                self._safe_close(db_type, conn)
+                continue
+
+            try:
+                conn = self._connect(db_type, connection_params)
+            except Exception:
+                with self._lock:
+                    slot["connecting"] = False
+                    self._lock.notify_all()
+                raise
+            with self._lock:
+                slot["connecting"] = False
+                slot["shared"] = conn
+                slot["shared_refs"] += 1
+                self._lock.notify_all()
+            return conn
+
+    def release(self, db_type, connection_params, conn, broken=False):
+        """Return a connection to the pool, closing it if it is broken"""
+        if conn is None:
+            return
+        key = self.make_key(db_type, connection_params)
+
+        if db_type in self.shared_types:
+            with self._lock:
+                slot = self._slot(key)
+                slot["shared_refs"] = max(0, slot["shared_refs"] - 1)
+                slot["last_used"] = time.monotonic()
+                broken = broken and slot["shared"] is conn
+                if broken:
+                    slot["shared"] = None
+            if broken:
+                self._safe_close(db_type, conn)
+            return
+
+        if not broken and self._reset is not None:
+            try:
+                self._reset(db_type, conn)
+            except Exception:
+                broken = True
+        with self._lock:
+            slot = self._slot(key)
+            slot["in_use"] = max(0, slot["in_use"] - 1)
+            close = broken or len(slot["idle"]) >= self.max_size
+            if not close:
+                slot["idle"].append((conn, time.monotonic()))
+            self._lock.notify()
+        if close:
+            self._safe_close(db_type, conn)
+
+    @contextmanager
+    def connection(self, db_type, connection_params):
+        """Context manager that checks a connection out and returns it afterwards"""
+        conn = self.acquire(db_type, connection_params)
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = not self._is_alive(db_type, conn)
+            raise
+        finally:
+            self.release(db_type, connection_params, conn, broken=broken)
+
+    def stats(self):
+        """Return per-key counts of idle and in-use connections"""
+        with self._lock:
+            return {
+                key[0] + ":" + ",".join(f"{k}={v}" for k, v in key[1] if k != "password"): {
+                    "idle": len(slot["idle"]) + (1 if slot["shared"] is not None and not slot["shared_refs"] else 0),
+                    "in_use": slot["in_use"] + slot["shared_refs"],
+                }
+                for key, slot in self._slots.items()
+            }
+
+    def close_all(self):
+        """Close every idle connection and shared client"""
+        closing = []
+        with self._lock:
+            for key, slot in self._slots.items():
+                while slot["idle"]:
+                    conn, _ = slot["idle"].pop()
+                    closing.append((key[0], conn))
+                if slot["shared"] is not None:
+                    closing.append((key[0], slot["shared"]))
+                    slot["shared"] = None
+                    slot["shared_refs"] = 0
+        self._close_each(closing)
+
+    def _prune_locked(self):
+        """Detach connections idle for longer than the idle timeout; returns them for closing outside the lock"""
+        stale = []
+        cutoff = time.monotonic() - self.idle_timeout
+        for key, slot in list(self._slots.items()):
+            db_type = key[0]
+            while slot["idle"] and slot["idle"][0][1] < cutoff:
+                conn, _ = slot["idle"].popleft()
+                stale.append((db_type, conn))
+            if slot["shared"] is not None and not slot["shared_refs"] and slot["last_used"] < cutoff:
+                stale.append((db_type, slot["shared"]))
+                slot["shared"] = None
+            if (not slot["idle"] and not slot["in_use"] and slot["shared"] is None and not slot["shared_refs"]
+                    and not slot["connecting"]):
+                del self._slots[key]
+        return stale
+
+    def _close_each(self, connections):
+        for db_type, conn in connections:
+            self._safe_close(db_type, conn)
+
+    def _is_alive(self, db_type, conn):
+        try:
+            self._ping(db_type, conn)
+            return True
+        except Exception:
+            return False
+
+    def _safe_close(self, db_type, conn):
+        try:
+            self._close(db_type, conn)
+        except Exception:
+            pass
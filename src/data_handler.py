@@ -1,12 +1,46 @@
+import logging
 import pandas as pd
+import random
 import sqlite3
-import streamlit as st
-from config import CSV_ENCODINGS, SUPPORTED_SQL_DB_TYPES
+import sys
+import threading
+import time
+from config import (
+    CSV_ENCODINGS,
+    SUPPORTED_SQL_DB_TYPES,
+    SUPPORTED_NOSQL_DB_TYPES,
+    SUPPORTED_DB_TYPES,
+    POOL_MAX_SIZE,
+    POOL_IDLE_TIMEOUT,
+    POOL_CHECKOUT_TIMEOUT,
+    CATALOG_CACHE_TTL,
+    LOAD_MEMORY_BUDGET_MB,
+    LOAD_MIN_ROWS,
+    LOAD_MAX_ROWS,
+)
+from connection_pool import ConnectionPool
+from tracing import traced
+
+# Catalog metadata cached per connection key: {key: (fetched_at, catalog)}
+_catalog_cache = {}
+_catalog_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def _report_error(message):
+    """Show an error in the Streamlit UI when running in it; log it in headless mode"""
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        st.error(message)
+    else:
+        logger.error(message)
 
 class DataHandler:
     """Handles data loading from CSV files and database connections (SQL & NoSQL)"""
     
     @staticmethod
+    @traced("data.load_csv")
     def load_csv(uploaded_file):
         """Load CSV file with multiple fallback strategies"""
         df = None
@@ -43,69 +77,112 @@ class DataHandler:
         return df, error_messages
     
     @staticmethod
-    def load_from_database(db_type, connection_params):
-        """Load data from database connection (SQL or NoSQL)"""
-        try:
-            # SQL Databases
-            if db_type == "PostgreSQL":
-                import psycopg2
-                conn = psycopg2.connect(**connection_params)
-            elif db_type == "MySQL":
-                import mysql.connector
-                conn = mysql.connector.connect(**connection_params)
-            elif db_type == "SQLite":
-                conn = sqlite3.connect(connection_params.get('database', ':memory:'))
-            elif db_type == "SQL Server":
-                import pyodbc
-                conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={connection_params['host']};DATABASE={connection_params['database']};UID={connection_params['user']};PWD={connection_params['password']}"
-                conn = pyodbc.connect(conn_str)
-            
-            # NoSQL Databases
-            elif db_type == "MongoDB":
-                from pymongo import MongoClient
-                conn_str = f"mongodb://{connection_params.get('user', '')}:{connection_params.get('password', '')}@{connection_params['host']}:{connection_params.get('port', 27017)}"
-                if not connection_params.get('user'):
-                    conn_str = f"mongodb://{connection_params['host']}:{connection_params.get('port', 27017)}"
-                client = MongoClient(conn_str)
-                db = client[connection_params['database']]
-                return {'client': client, 'db': db, 'type': 'mongodb'}, None, None
+    def _open_connection(db_type, connection_params):
+        """Open a new raw connection (SQL) or client handle (NoSQL)"""
+        # SQL Databases
+        if db_type == "PostgreSQL":
+            import psycopg2
+            return psycopg2.connect(**connection_params)
+        elif db_type == "MySQL":
+            import mysql.connector
+            return mysql.connector.connect(**connection_params)
+        elif db_type == "SQLite":
+            # Pooled connections may be reused from another Streamlit script thread
+            return sqlite3.connect(connection_params.get('database', ':memory:'), check_same_thread=False)
+        elif db_type == "SQL Server":
+            import pyodbc
+            conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={connection_params['host']};DATABASE={connection_params['database']};UID={connection_params['user']};PWD={connection_params['password']}"
+            return pyodbc.connect(conn_str)
+        
+        # NoSQL Databases
+        elif db_type == "MongoDB":
+            from pymongo import MongoClient
+            conn_str = f"mongodb://{connection_params.get('user', '')}:{connection_params.get('password', '')}@{connection_params['host']}:{connection_params.get('port', 27017)}"
+            if not connection_params.get('user'):
+                conn_str = f"mongodb://{connection_params['host']}:{connection_params.get('port', 27017)}"
+            client = MongoClient(conn_str)
+            db = client[connection_params['database']]
+            return {'client': client, 'db': db, 'type': 'mongodb'}
+        
+        elif db_type == "Redis":
+            import redis
+            conn = redis.Redis(
+                host=connection_params['host'],
+                port=connection_params.get('port', 6379),
+                password=connection_params.get('password', None),
+                db=connection_params.get('database', 0),
+                decode_responses=True
+            )
+            return {'client': conn, 'type': 'redis'}
+        
+        elif db_type == "Cassandra":
+            from cassandra.cluster import Cluster
+            from cassandra.auth import PlainTextAuthProvider
             
-            elif db_type == "Redis":
-                import redis
-                conn = redis.Redis(
-                    host=connection_params['host'],
-                    port=connection_params.get('port', 6379),
-                    password=connection_params.get('password', None),
-                    db=connection_params.get('database', 0),
-                    decode_responses=True
+            if connection_params.get('user') and connection_params.get('password'):
+                auth_provider = PlainTextAuthProvider(
+                    username=connection_params['user'],
+                    password=connection_params['password']
                 )
-                return {'client': conn, 'type': 'redis'}, None, None
-            
-            elif db_type == "Cassandra":
-                from cassandra.cluster import Cluster
-                from cassandra.auth import PlainTextAuthProvider
-                
-                if connection_params.get('user') and connection_params.get('password'):
-                    auth_provider = PlainTextAuthProvider(
-                        username=connection_params['user'],
-                        password=connection_params['password']
-                    )
-                    cluster = Cluster([connection_params['host']], 
-                                    port=connection_params.get('port', 9042),
-                                    auth_provider=auth_provider)
-                else:
-                    cluster = Cluster([connection_params['host']], 
-                                    port=connection_params.get('port', 9042))
-                
-                session = cluster.connect()
-                if connection_params.get('keyspace'):
-                    session.set_keyspace(connection_params['keyspace'])
-                
-                return {'cluster': cluster, 'session': session, 'type': 'cassandra'}, None, None
-            
+                cluster = Cluster([connection_params['host']], 
+                                port=connection_params.get('port', 9042),
+                                auth_provider=auth_provider)
             else:
-                return None, None, f"Unsupported database type: {db_type}"
+                cluster = Cluster([connection_params['host']], 
+                                port=connection_params.get('port', 9042))
+            
+            session = cluster.connect()
+            if connection_params.get('keyspace'):
+                session.set_keyspace(connection_params['keyspace'])
             
+            return {'cluster': cluster, 'session': session, 'type': 'cassandra'}
+        
+        raise ValueError(f"Unsupported database type: {db_type}")
+    
+    @staticmethod
+    def _ping_connection(db_type, conn):
+        """Cheap liveness check run on every pool checkout"""
+        if db_type in SUPPORTED_SQL_DB_TYPES:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        elif db_type == "MongoDB":
+            conn['client'].admin.command('ping')
+        elif db_type == "Redis":
+            conn['client'].ping()
+        elif db_type == "Cassandra":
+            conn['session'].execute("SELECT release_version FROM system.local")
+    
+    @staticmethod
+    def _reset_connection(db_type, conn):
+        """End the transaction a returned connection may be in (drivers such as
+        mysql.connector and psycopg2 open one implicitly), so its next borrower
+        sees current data and the server isn't held idle in a transaction"""
+        if db_type in SUPPORTED_SQL_DB_TYPES:
+            conn.rollback()
+    
+    @staticmethod
+    def _close_connection(db_type, conn):
+        """Close a connection or client handle"""
+        if db_type in SUPPORTED_SQL_DB_TYPES:
+            conn.close()
+        elif db_type in ("MongoDB", "Redis"):
+            conn['client'].close()
+        elif db_type == "Cassandra":
+            conn['cluster'].shutdown()
+    
+    @staticmethod
+    @traced("data.connect")
+    def load_from_database(db_type, connection_params):
+        """Check out a pooled database connection (SQL or NoSQL)"""
+        if db_type not in SUPPORTED_DB_TYPES:
+            return None, None, f"Unsupported database type: {db_type}"
+        
+        try:
+            conn = connection_pool.acquire(db_type, connection_params)
             return conn, None, None
         except ImportError as e:
             driver_name = str(e).split()[-1].replace("'", "")
@@ -122,6 +199,11 @@ class DataHandler:
         except Exception as e:
             return None, None, f"Connection error: {str(e)}"
     
+    @staticmethod
+    def release_connection(db_type, connection_params, conn, broken=False):
+        """Return a connection checked out by load_from_database to the pool"""
+        connection_pool.release(db_type, connection_params, conn, broken=broken)
+    
     @staticmethod
     def get_tables(conn, db_type):
         """Get list of tables/collections from database"""
@@ -183,23 +265,375 @@ class DataHandler:
             else:
                 return []
         except Exception as e:
-            st.error(f"Error fetching tables: {str(e)}")
+            _report_error(f"Error fetching tables: {str(e)}")
             return []
     
     @staticmethod
-    def load_table(conn, table_name, db_type, limit=10000):
-        """Load entire table/collection from database"""
+    @traced("data.catalog")
+    def get_table_catalog(conn, db_type, connection_params=None):
+        """Get tables with column types and row-count estimates from database catalogs.
+
+        Results are cached per connection for CATALOG_CACHE_TTL seconds. Row counts
+        come from planner statistics, so they are estimates and may be None.
+        """
+        cache_key = ConnectionPool.make_key(db_type, connection_params) if connection_params is not None else None
+        if cache_key is not None:
+            with _catalog_lock:
+                cached = _catalog_cache.get(cache_key)
+                if cached and time.monotonic() - cached[0] < CATALOG_CACHE_TTL:
+                    return cached[1]
+        
+        try:
+            catalog = DataHandler._read_catalog(conn, db_type)
+        except Exception as e:
+            _report_error(f"Error fetching table catalog: {str(e)}")
+            return {name: {"columns": [], "row_estimate": None} for name in DataHandler.get_tables(conn, db_type)}
+        
+        if cache_key is not None:
+            with _catalog_lock:
+                _catalog_cache[cache_key] = (time.monotonic(), catalog)
+        return catalog
+    
+    @staticmethod
+    def invalidate_catalog(db_type, connection_params):
+        """Drop cached catalog metadata for a connection"""
+        with _catalog_lock:
+            _catalog_cache.pop(ConnectionPool.make_key(db_type, connection_params), None)
+    
+    @staticmethod
+    def _read_catalog(conn, db_type):
+        """Query catalog/statistics tables without scanning table data"""
+        catalog = {}
+        
+        def add_column(table, column, dtype):
+            catalog.setdefault(table, {"columns": [], "row_estimate": None})["columns"].append((column, str(dtype)))
+        
+        def set_estimate(table, rows):
+            if table in catalog and rows is not None and rows >= 0:
+                catalog[table]["row_estimate"] = int(rows)
+        
+        # SQL Databases
+        if db_type == "PostgreSQL":
+            cols = pd.read_sql_query(
+                "SELECT table_name, column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = 'public' ORDER BY table_name, ordinal_position", conn)
+            for table, column, dtype in cols.itertuples(index=False):
+                add_column(table, column, dtype)
+            stats = pd.read_sql_query(
+                "SELECT c.relname, c.reltuples FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')", conn)
+            for table, rows in stats.itertuples(index=False):
+                # reltuples is -1 for tables that have never been analyzed
+                set_estimate(table, rows if rows >= 0 else None)
+        
+        elif db_type == "MySQL":
+            cols = pd.read_sql_query(
+                "SELECT table_name, column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = DATABASE() ORDER BY table_name, ordinal_position", conn)
+            for table, column, dtype in cols.itertuples(index=False):
+                add_column(table, column, dtype)
+            stats = pd.read_sql_query("SHOW TABLE STATUS", conn)
+            for _, row in stats.iterrows():
+                set_estimate(row["Name"], row["Rows"] if pd.notna(row["Rows"]) else None)
+        
+        elif db_type == "SQLite":
+            tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+            for table in tables:
+                catalog[table] = {"columns": [], "row_estimate": None}
+                for _, column, dtype, *_ in conn.execute(f'PRAGMA table_info("{table}")'):
+                    add_column(table, column, dtype or "ANY")
+            
+            has_stat = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+            if has_stat:
+                # The first number in stat is the row count of the table/index
+                for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+                    if catalog.get(table, {}).get("row_estimate") is None and stat:
+                        set_estimate(table, int(stat.split()[0]))
+            for table in tables:
+                if catalog[table]["row_estimate"] is None:
+                    # max(rowid) is a b-tree seek, not a scan; an upper bound for rowid tables
+                    try:
+                        max_rowid = conn.execute(f'SELECT max(rowid) FROM "{table}"').fetchone()[0]
+                        set_estimate(table, max_rowid or 0)
+                    except sqlite3.Error:
+                        pass
+        
+        elif db_type == "SQL Server":
+            cols = pd.read_sql_query(
+                "SELECT c.table_name, c.column_name, c.data_type FROM information_schema.columns c "
+                "JOIN information_schema.tables t ON t.table_name = c.table_name AND t.table_schema = c.table_schema "
+                "WHERE t.table_type = 'BASE TABLE' ORDER BY c.table_name, c.ordinal_position", conn)
+            for table, column, dtype in cols.itertuples(index=False):
+                add_column(table, column, dtype)
+            stats = pd.read_sql_query(
+                "SELECT t.name, SUM(p.rows) FROM sys.tables t "
+                "JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1) "
+                "GROUP BY t.name", conn)
+            for table, rows in stats.itertuples(index=False):
+                set_estimate(table, rows)
+        
+        # NoSQL Databases
+        elif db_type == "MongoDB":
+            db = conn['db']
+            for name in db.list_collection_names():
+                collection = db[name]
+                catalog[name] = {"columns": [], "row_estimate": collection.estimated_document_count()}
+                # Collections are schemaless; describe the fields of one document
+                doc = collection.find_one() or {}
+                for field, value in doc.items():
+                    add_column(name, field, type(value).__name__)
+        
+        elif db_type == "Redis":
+            counts = {}
+            cursor = 0
+            while True:
+                cursor, partial_keys = conn['client'].scan(cursor, count=1000)
+                for key in partial_keys:
+                    prefix = key.split(':')[0] if ':' in key else 'all_keys'
+                    counts[prefix] = counts.get(prefix, 0) + 1
+                if cursor == 0:
+                    break
+            for prefix in sorted(counts) or ['all_keys']:
+                catalog[prefix] = {
+                    "columns": [("key", "str"), ("type", "str"), ("value", "str")],
+                    "row_estimate": counts.get(prefix, 0),
+                }
+        
+        elif db_type == "Cassandra":
+            session = conn['session']
+            keyspace = session.keyspace
+            if not keyspace:
+                return {name: {"columns": [], "row_estimate": None} for name in DataHandler.get_tables(conn, db_type)}
+            
+            rows = session.execute(
+                "SELECT table_name, column_name, type FROM system_schema.columns WHERE keyspace_name = %s",
+                (keyspace,))
+            for row in rows:
+                add_column(row.table_name, row.column_name, row.type)
+            try:
+                # size_estimates holds per-token-range partition counts maintained by each node
+                rows = session.execute(
+                    "SELECT table_name, partitions_count FROM system.size_estimates WHERE keyspace_name = %s",
+                    (keyspace,))
+                totals = {}
+                for row in rows:
+                    totals[row.table_name] = totals.get(row.table_name, 0) + (row.partitions_count or 0)
+                for table, rows_est in totals.items():
+                    set_estimate(table, rows_est)
+            except Exception:
+                pass
+        
+        return catalog
+    
+    @staticmethod
+    def rows_for_budget(table_info=None, budget_mb=LOAD_MEMORY_BUDGET_MB):
+        """Number of rows that fit the in-memory load budget, from catalog column types"""
+        # Unknown schema: assume ten text columns
+        columns = (table_info or {}).get("columns") or [("", "")] * 10
+        row_bytes = 8  # index
+        for _, dtype in columns:
+            dtype = dtype.lower()
+            if any(t in dtype for t in ("int", "float", "double", "numeric", "decimal", "real", "date", "time")):
+                row_bytes += 8
+            elif "bool" in dtype:
+                row_bytes += 1
+            else:
+                row_bytes += 64  # object pointer plus a short Python string
+        rows = int(budget_mb * 1024 * 1024 / row_bytes)
+        return max(LOAD_MIN_ROWS, min(LOAD_MAX_ROWS, rows))
+    
+    @staticmethod
+    def _sample_sql(conn, table_name, db_type, limit, row_estimate):
+        """Random sample using the backend's native sampling mechanism"""
+        # Oversample the fraction slightly so usually at least limit rows come back,
+        # then drop the surplus at random. The sampled scan itself has no LIMIT: one
+        # would stop it early and favour rows stored first (usually the oldest).
+        pct = None
+        if row_estimate:
+            pct = min(100.0, limit / row_estimate * 100 * 1.2)
+        # Only a badly stale row estimate gets near this; it keeps such a sample bounded
+        cap = limit * 10
+        
+        if db_type == "PostgreSQL":
+            if pct is not None and pct < 100:
+                query = f"SELECT * FROM {table_name} TABLESAMPLE BERNOULLI ({pct:.6f}) LIMIT {cap}"
+                return DataHandler._downsample(pd.read_sql_query(query, conn), limit)
+            query = f"SELECT * FROM {table_name} ORDER BY random() LIMIT {limit}"
+        elif db_type == "SQL Server":
+            if pct is not None and pct < 100:
+                query = f"SELECT TOP ({cap}) * FROM {table_name} TABLESAMPLE ({pct:.6f} PERCENT)"
+                return DataHandler._downsample(pd.read_sql_query(query, conn), limit)
+            query = f"SELECT TOP ({limit}) * FROM {table_name} ORDER BY NEWID()"
+        elif db_type == "MySQL":
+            # No TABLESAMPLE in MySQL; a RAND() filter is a single scan without a sort
+            if pct is not None and pct < 100:
+                query = f"SELECT * FROM {table_name} WHERE RAND() < {pct / 100:.8f} LIMIT {cap}"
+                return DataHandler._downsample(pd.read_sql_query(query, conn), limit)
+            query = f"SELECT * FROM {table_name} ORDER BY RAND() LIMIT {limit}"
+        elif db_type == "SQLite":
+            # Draw random rowids and fetch them by primary key seek
+            max_rowid = None
+            try:
+                max_rowid = conn.execute(f'SELECT max(rowid) FROM "{table_name}"').fetchone()[0]
+            except sqlite3.Error:
+                pass  # WITHOUT ROWID table
+            if max_rowid and max_rowid > limit:
+                ids = sorted(random.sample(range(1, max_rowid + 1), min(max_rowid, int(limit * 1.2))))
+                chunk = 10_000  # ids per statement, keeping each IN list short
+                df = pd.concat([
+                    pd.read_sql_query(
+                        f'SELECT * FROM "{table_name}" WHERE rowid IN ({",".join(map(str, ids[i:i + chunk]))})', conn)
+                    for i in range(0, len(ids), chunk)
+                ], ignore_index=True)
+                return DataHandler._downsample(df, limit)
+            query = f'SELECT * FROM "{table_name}" ORDER BY random() LIMIT {limit}'
+        
+        return pd.read_sql_query(query, conn)
+    
+    @staticmethod
+    def _downsample(df, limit):
+        """limit rows of df picked at random, kept in their fetched (storage) order"""
+        return df.sample(n=min(limit, len(df))).sort_index().reset_index(drop=True)
+    
+    @staticmethod
+    def _sample_cassandra(session, table_name, limit, ranges=16):
+        """Sample by reading short runs starting at random Murmur3 token positions"""
+        keyspace = session.keyspace
+        rows = session.execute(
+            "SELECT column_name, kind, position FROM system_schema.columns "
+            "WHERE keyspace_name = %s AND table_name = %s", (keyspace, table_name))
+        partition_key = [r.column_name for r in sorted(rows, key=lambda r: r.position) if r.kind == 'partition_key']
+        if not partition_key:
+            return [row._asdict() for row in session.execute(f"SELECT * FROM {table_name} LIMIT {limit}")]
+        
+        token = f"token({', '.join(partition_key)})"
+        per_range = max(1, limit // ranges)
+        data = []
+        for start in sorted(random.randint(-2**63, 2**63 - 1) for _ in range(ranges)):
+            query = f"SELECT * FROM {table_name} WHERE {token} >= {start} LIMIT {per_range}"
+            data.extend(row._asdict() for row in session.execute(query))
+        return data[:limit]
+    
+    @staticmethod
+    def _stratify(df, column, limit):
+        """Proportional stratified downsample keeping at least one row per stratum"""
+        if column not in df.columns or len(df) <= limit:
+            return df.head(limit)
+        counts = df[column].value_counts(dropna=False)
+        alloc = (counts / counts.sum() * limit).clip(lower=1).round().astype(int)
+        parts = [
+            group.sample(min(len(group), alloc.get(key, 1)), random_state=0)
+            for key, group in df.groupby(column, dropna=False, sort=False)
+        ]
+        return pd.concat(parts).sample(frac=1, random_state=0).head(limit).reset_index(drop=True)
+    
+    @staticmethod
+    def _watermark_param(value):
+        """Plain Python value for a driver query parameter (no numpy/pandas scalars)"""
+        if hasattr(value, "to_pydatetime"):
+            return value.to_pydatetime()
+        if hasattr(value, "item"):
+            return value.item()
+        return value
+    
+    @staticmethod
+    @traced("data.load_increment")
+    def load_increment(conn, table_name, db_type, column, after=None, limit=10000):
+        """Rows whose watermark column is greater than after, in column order.
+
+        With after=None, the newest `limit` rows (the initial load of an
+        incremental dataset). The column should be unique and increasing, e.g.
+        an id; rows added later with an already-loaded timestamp are skipped.
+        """
+        try:
+            if db_type in SUPPORTED_SQL_DB_TYPES:
+                if db_type == "SQLite":
+                    table_name, column = f'"{table_name}"', f'"{column}"'
+                placeholder = "%s" if db_type in ("PostgreSQL", "MySQL") else "?"
+                where, params = "", None
+                if after is not None:
+                    where, params = f" WHERE {column} > {placeholder}", (DataHandler._watermark_param(after),)
+                order = "ASC" if after is not None else "DESC"
+                if db_type == "SQL Server":
+                    query = f"SELECT TOP ({limit}) * FROM {table_name}{where} ORDER BY {column} {order}"
+                else:
+                    query = f"SELECT * FROM {table_name}{where} ORDER BY {column} {order} LIMIT {limit}"
+                df = pd.read_sql_query(query, conn, params=params)
+            
+            elif db_type == "MongoDB":
+                after = DataHandler._watermark_param(after)
+                if column == '_id' and isinstance(after, str):
+                    from bson import ObjectId
+                    after = ObjectId(after)  # loaded frames hold _id as a string
+                query = {column: {"$gt": after}} if after is not None else {}
+                cursor = conn['db'][table_name].find(query).sort(column, 1 if after is not None else -1).limit(limit)
+                df = pd.DataFrame(list(cursor))
+                if '_id' in df.columns:
+                    df['_id'] = df['_id'].astype(str)
+            
+            else:
+                return None, f"Incremental refresh is not supported for {db_type}"
+            
+            if after is None:
+                df = df.iloc[::-1].reset_index(drop=True)  # fetched newest first
+            return df, None
+        
+        except Exception as e:
+            return None, f"Error loading new rows: {str(e)}"
+    
+    @staticmethod
+    def _mark_sqlite_source(df, conn, table_name):
+        """Record the file a SQLite table came from, so SQL answers read it in place"""
+        path = next((row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main"), "")
+        if path:  # empty for in-memory databases
+            df.attrs["sqlite_source"] = (path, table_name)
+    
+    @staticmethod
+    @traced("data.load_table")
+    def load_table(conn, table_name, db_type, limit=10000, sample=False, stratify_by=None, row_estimate=None,
+                   watermark=None, budget_rows=None):
+        """Load table/collection from database: the first rows, a random sample, or the newest rows.
+
+        With stratify_by, an oversample of up to 3x (never more rows than
+        budget_rows, by default rows_for_budget()) is drawn and downsampled
+        proportionally per value of that column so small groups stay represented. With
+        watermark (a column name), the newest rows by that column are loaded so
+        the dataset can later be refreshed incrementally.
+        """
+        if watermark:
+            df, error = DataHandler.load_increment(conn, table_name, db_type, watermark, None, limit)
+            if df is not None and db_type == "SQLite":
+                DataHandler._mark_sqlite_source(df, conn, table_name)
+            return df, error
+        fetch = limit
+        if sample and stratify_by:
+            # The oversample is held in memory too, so it stays within the load budget
+            budget_rows = budget_rows or DataHandler.rows_for_budget()
+            fetch = min(limit * 3, max(limit, budget_rows))
         try:
             # SQL Databases
             if db_type in SUPPORTED_SQL_DB_TYPES:
-                query = f"SELECT * FROM {table_name} LIMIT {limit}"
-                df = pd.read_sql_query(query, conn)
+                if sample:
+                    df = DataHandler._sample_sql(conn, table_name, db_type, fetch, row_estimate)
+                elif db_type == "SQL Server":
+                    df = pd.read_sql_query(f"SELECT TOP ({limit}) * FROM {table_name}", conn)
+                else:
+                    query = f"SELECT * FROM {table_name} LIMIT {limit}"
+                    df = pd.read_sql_query(query, conn)
+                if sample and stratify_by:
+                    df = DataHandler._stratify(df, stratify_by, limit)
+                if db_type == "SQLite":
+                    DataHandler._mark_sqlite_source(df, conn, table_name)
                 return df, None
             
             # NoSQL Databases
             elif db_type == "MongoDB":
                 collection = conn['db'][table_name]
-                cursor = collection.find().limit(limit)
+                if sample:
+                    cursor = collection.aggregate([{"$sample": {"size": fetch}}])
+                else:
+                    cursor = collection.find().limit(limit)
                 data = list(cursor)
                 
                 if not data:
@@ -209,13 +643,18 @@ class DataHandler:
                 # Convert ObjectId to string for display
                 if '_id' in df.columns:
                     df['_id'] = df['_id'].astype(str)
+                if sample and stratify_by:
+                    df = DataHandler._stratify(df, stratify_by, limit)
                 
                 return df, None
             
             elif db_type == "Redis":
+                if sample:
+                    return None, "Random sampling isn't supported for Redis"
                 redis_client = conn['client']
                 
-                # Get keys with the prefix (pattern)
+                # Get keys with the prefix (pattern); random sampling isn't offered
+                # for Redis, since SCAN returns the same leading keys every time
                 if table_name == 'all_keys':
                     pattern = '*'
                 else:
@@ -269,17 +708,22 @@ class DataHandler:
                 return df, None
             
             elif db_type == "Cassandra":
-                query = f"SELECT * FROM {table_name} LIMIT {limit}"
-                rows = conn['session'].execute(query)
-                
-                data = []
-                for row in rows:
-                    data.append(row._asdict())
+                if sample:
+                    data = DataHandler._sample_cassandra(conn['session'], table_name, fetch)
+                else:
+                    query = f"SELECT * FROM {table_name} LIMIT {limit}"
+                    rows = conn['session'].execute(query)
+                    
+                    data = []
+                    for row in rows:
+                        data.append(row._asdict())
                 
                 if not data:
                     return None, "Table is empty"
                 
                 df = pd.DataFrame(data)
+                if sample and stratify_by:
+                    df = DataHandler._stratify(df, stratify_by, limit)
                 return df, None
             
             else:
@@ -298,20 +742,31 @@ class DataHandler:
             return None, f"Query error: {str(e)}"
     
     @staticmethod
-    def generate_schema(df, source_type="csv", table_name=None):
-        """Generate schema description from DataFrame"""
+    @traced("data.generate_schema")
+    def generate_schema(df, source_type="csv", table_name=None, table_info=None, null_counts=None):
+        """Generate schema description from DataFrame, enriched with catalog metadata when available.
+
+        null_counts (per column) skips rescanning df, e.g. after an incremental refresh.
+        """
         rows, cols = df.shape
         schema_lines = [f"Data Source: {source_type.upper()}"]
         if table_name:
             schema_lines.append(f"Table: {table_name}")
         schema_lines.append(f"{rows:,} rows × {cols} columns")
+        
+        row_estimate = (table_info or {}).get("row_estimate")
+        if row_estimate is not None and row_estimate > rows:
+            schema_lines.append(f"Source table has ~{row_estimate:,} rows (loaded subset shown above)")
+        source_types = dict((table_info or {}).get("columns", []))
+        
         schema_lines.append("\nColumns:")
         
         for col in df.columns[:15]:
             dtype = df[col].dtype
-            null_count = df[col].isnull().sum()
+            null_count = null_counts[col] if null_counts is not None else df[col].isnull().sum()
             null_pct = (null_count / len(df) * 100) if len(df) > 0 else 0
-            schema_lines.append(f"  - {col} ({dtype}) - {null_pct:.1f}% null")
+            source_type_note = f", source: {source_types[col]}" if col in source_types else ""
+            schema_lines.append(f"  - {col} ({dtype}{source_type_note}) - {null_pct:.1f}% null")
         
         if cols > 15:
             schema_lines.append(f"  ... and {cols - 15} more columns")
@@ -320,49 +775,27 @@ class DataHandler:
     
     @staticmethod
     def test_connection(db_type, connection_params):
-        """Test database connection"""
+        """Test database connection; the verified connection stays pooled for Connect"""
         conn, _, error = DataHandler.load_from_database(db_type, connection_params)
         if error:
             return False, error
         
         try:
-            # SQL Databases
-            if db_type in SUPPORTED_SQL_DB_TYPES:
-                if db_type == "SQLite":
-                    pd.read_sql_query("SELECT 1", conn)
-                else:
-                    pd.read_sql_query("SELECT 1 as test", conn)
-                conn.close()
-            
-            # NoSQL Databases
-            elif db_type == "MongoDB":
-                # Try to list databases
-                conn['client'].list_database_names()
-                conn['client'].close()
-            
-            elif db_type == "Redis":
-                # Try to ping
-                conn['client'].ping()
-                conn['client'].close()
-            
-            elif db_type == "Cassandra":
-                # Try a simple query
-                conn['session'].execute("SELECT release_version FROM system.local")
-                conn['cluster'].shutdown()
-            
+            DataHandler._ping_connection(db_type, conn)
+            DataHandler.release_connection(db_type, connection_params, conn)
             return True, "Connection successful!"
         except Exception as e:
-            # Clean up connections
-            try:
-                if db_type in SUPPORTED_SQL_DB_TYPES and conn:
-                    conn.close()
-                elif db_type == "MongoDB" and conn:
-                    conn['client'].close()
-                elif db_type == "Redis" and conn:
-                    conn['client'].close()
-                elif db_type == "Cassandra" and conn:
-                    conn['cluster'].shutdown()
-            except:
-                pass
-            
-            return False, f"Connection test failed: {str(e)}"
\ No newline at end of file
+            DataHandler.release_connection(db_type, connection_params, conn, broken=True)
+            return False, f"Connection test failed: {str(e)}"
+
+
+connection_pool = ConnectionPool(
+    connect=DataHandler._open_connection,
+    ping=DataHandler._ping_connection,
+    close=DataHandler._close_connection,
+    reset=DataHandler._reset_connection,
+    max_size=POOL_MAX_SIZE,
+    idle_timeout=POOL_IDLE_TIMEOUT,
+    checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+    shared_types=SUPPORTED_NOSQL_DB_TYPES,
+)
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+
+import pandas as pd
+
+from config import DATASET_STORE_IDLE_MB, DATASET_STORE_DB_MAX_AGE
+from connection_pool import ConnectionPool
+from result_cache import assign_version, estimate_size
+
+# Session views share the stored frame's data; copy-on-write keeps one session's
+# writes from reaching the others (the default from pandas 3)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+class _Entry:
+    __slots__ = ("df", "version", "size", "loaded_at", "refs")
+
+    def __init__(self, df):
+        self.df = df
+        self.version = assign_version(df)  # a fresh load is a new version; its views share it
+        self.size = estimate_size(df)
+        self.loaded_at = time.monotonic()
+        self.refs = 0
+
+
+class DatasetStore:
+    """Process-wide registry of loaded datasets, shared read-only by sessions.
+
+    Datasets are keyed by source identity (a CSV's content hash, or a database
+    table with its load options). Each session gets a shallow copy-on-write
+    view of the one stored frame, so memory doesn't grow with the number of
+    sessions on the same data, and views keep the stored dataset version so
+    result, prompt and sandbox caches are shared as well. A view's reference
+    is released when it is garbage collected (the session dropped the
+    dataset or expired); datasets no session uses are kept up to
+    idle_bytes, least recently used first out.
+    """
+
+    def __init__(self, idle_bytes=DATASET_STORE_IDLE_MB * 1024 * 1024):
+        self.idle_bytes = idle_bytes
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._loading = {}  # key -> lock, so concurrent sessions load a dataset once
+        # Views released by the garbage collector, which may run while _lock is held;
+        # applied by the next store operation
+        self._released = deque()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def csv_key(data):
+        """Key of an uploaded CSV by content, whichever session uploaded it"""
+        return ("csv", hashlib.sha1(data).hexdigest())
+
+    @staticmethod
+    def table_key(db_type, connection_params, table, **options):
+        """Key of a database table loaded with the given options"""
+        return ("table", ConnectionPool.make_key(db_type, connection_params), table, tuple(sorted(options.items())))
+
+    def get_or_load(self, key, load, max_age=None):
+        """A session view of the dataset for key, calling load() -> (df, error) on a miss.
+
+        max_age (seconds) reloads a stored dataset older than that, e.g. so a
+        database table isn't served stale to a session that just asked for it.
+        Returns (view, error).
+        """
+        with self._lock:
+            lock = self._loading.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                self._drain()
+                entry = self._entries.get(key)
+                if entry is not None and max_age is not None and time.monotonic() - entry.loaded_at > max_age:
+                    del self._entries[key]  # existing views keep their frame
+                    entry = None
+                if entry is not None:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return self._view(entry), None
+
+            df, error = load()
+            if df is None:
+                return None, error
+            entry = _Entry(df)
+            with self._lock:
+                self._drain()
+                self.misses += 1
+                self._entries[key] = entry
+                view = self._view(entry)
+                self._evict()
+            return view, None
+
+    def get_or_load_table(self, db_type, connection_params, table, load, **options):
+        """get_or_load for a database table; reused for DATASET_STORE_DB_MAX_AGE seconds"""
+        key = self.table_key(db_type, connection_params, table, **options)
+        return self.get_or_load(key, load, max_age=DATASET_STORE_DB_MAX_AGE)
+
+    def _view(self, entry):
+        view = entry.df.copy(deep=False)
+        assign_version(view, entry.version)
+        entry.refs += 1
+        weakref.finalize(view, self._released.append, entry)
+        return view
+
+    def _drain(self):
+        """Apply released views and evict what no session holds any more (with _lock held)"""
+        released = False
+        while self._released:
+            self._released.popleft().refs -= 1
+            released = True
+        if released:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used datasets no session holds until idle ones fit idle_bytes"""
+        idle = [(key, entry) for key, entry in self._entries.items() if entry.refs == 0]
+        idle_bytes = sum(entry.size for _, entry in idle)
+        for key, entry in idle:
+            if idle_bytes <= self.idle_bytes:
+                break
+            del self._entries[key]
+            self._loading.pop(key, None)
+            idle_bytes -= entry.size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            self._drain()
+            return {
+                "datasets": len(self._entries),
+                "in_use": sum(1 for entry in self._entries.values() if entry.refs),
+                "views": sum(entry.refs for entry in self._entries.values()),
+                "bytes": sum(entry.size for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+dataset_store = DatasetStore()
@@ -0,0 +1,418 @@
+import ast
+import copy
+
+import pandas as pd
+
+# Aggregations that give the same result whether columns are selected before or after
+AGGREGATIONS = {"sum", "mean", "max", "min", "median", "count", "nunique", "std", "var", "prod", "first", "last"}
+# numpy reductions that dispatch to the pandas method of the same name
+NP_AGGREGATIONS = {"sum", "mean", "max", "min", "median", "prod"}
+MASK_METHODS = {"isin", "isna", "isnull", "notna", "notnull", "between", "contains",
+                "startswith", "endswith", "match", "duplicated"}
+MASK_NAMES = {"df", "pd", "np"}
+
+
+def topk(obj, n, by=None, ascending=True):
+    """Top-n rows by a column via nlargest/nsmallest, or sort + head when that isn't equivalent.
+
+    nlargest/nsmallest only handle numeric data and drop NaN (which sort_values
+    places last), so fall back whenever either could change the result. Tied
+    rows keep their original order either way, as with a stable sort.
+    """
+    col = obj if by is None else obj[by]
+    if (pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col)
+            and col.count() >= min(n, len(col))):
+        if by is None:
+            return obj.nsmallest(n) if ascending else obj.nlargest(n)
+        return obj.nsmallest(n, by) if ascending else obj.nlargest(n, by)
+    sorted_obj = (obj.sort_values(ascending=ascending, kind="stable") if by is None
+                  else obj.sort_values(by, ascending=ascending, kind="stable"))
+    return sorted_obj.head(n)
+
+
+def _numeric(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)
+
+
+# Column dtypes each aggregation accepts without raising (object columns may hold anything)
+_AGGREGATES_WITHOUT_ERROR = {
+    "count": lambda dtype: True,
+    "first": lambda dtype: True,
+    "last": lambda dtype: True,
+    "sum": lambda dtype: _numeric(dtype) or isinstance(dtype, pd.StringDtype),
+    "max": lambda dtype: (_numeric(dtype) or isinstance(dtype, pd.StringDtype)
+                          or pd.api.types.is_datetime64_any_dtype(dtype)),
+    "min": lambda dtype: (_numeric(dtype) or isinstance(dtype, pd.StringDtype)
+                          or pd.api.types.is_datetime64_any_dtype(dtype)),
+    "nunique": lambda dtype: (_numeric(dtype) or isinstance(dtype, pd.StringDtype)
+                              or pd.api.types.is_datetime64_any_dtype(dtype)),
+}
+
+
+def pruned_aggregate(grouped, columns, func):
+    """`grouped.<func>()[columns]`, aggregating only the selected columns where that's equivalent.
+
+    The full aggregation raises when any column can't be aggregated (mean over
+    text, say); pruning would skip that column and succeed, so unless every
+    dropped column is known to aggregate cleanly the full aggregation runs.
+    """
+    obj = grouped.obj
+    # Key columns given by name are left out of the aggregation; Series keys aren't columns
+    keys = {k for k in (grouped.keys if isinstance(grouped.keys, list) else [grouped.keys]) if isinstance(k, str)}
+    selected = columns if isinstance(columns, list) else [columns]
+    accepts = _AGGREGATES_WITHOUT_ERROR.get(func, _numeric)
+    if (isinstance(obj, pd.DataFrame) and obj.columns.is_unique
+            and all(c in obj.columns and c not in keys for c in selected)
+            and all(accepts(dtype) for c, dtype in obj.dtypes.items() if c not in selected and c not in keys)):
+        return getattr(grouped[columns], func)()
+    return getattr(grouped, func)()[columns]
+
+
+# Names the optimizer may introduce; injected into the evaluation namespace
+HELPERS = {"_topk": topk, "_pruned_aggregate": pruned_aggregate}
+
+
+def _call_parts(node, attr):
+    """If node is `<value>.<attr>(...)`, return (value, args, keywords)"""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == attr:
+        return node.func.value, node.args, node.keywords
+    return None
+
+
+def _is_const(node, kind):
+    """Constant of exactly this type (so True doesn't count as an int)"""
+    return isinstance(node, ast.Constant) and type(node.value) is kind
+
+
+def _is_column_selector(node):
+    if _is_const(node, str):
+        return True
+    return isinstance(node, ast.List) and node.elts and all(_is_const(e, str) for e in node.elts)
+
+
+def _is_column_operand(node):
+    """Column of df, constant, or arithmetic on them: a Series or scalar, never a DataFrame"""
+    if _column_ref(node) is not None or isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITH_OPS:
+        return _is_column_operand(node.left) and _is_column_operand(node.right)
+    return isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and _is_column_operand(node.operand)
+
+
+def _is_mask(node):
+    """Boolean Series row mask over df's columns (so it can be combined with another).
+
+    DataFrame-wide masks such as `df > 0` are excluded: indexing with one
+    masks cells rather than selecting rows, so it can't be merged with &.
+    """
+    if not all(n.id in MASK_NAMES for n in ast.walk(node) if isinstance(n, ast.Name)):
+        return False
+    if isinstance(node, ast.Compare):
+        operands = [node.left, *node.comparators]
+        return (all(_is_column_operand(op) for op in operands)
+                and any(_column_ref(n) is not None for op in operands for n in ast.walk(op)))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor)):
+        return _is_mask(node.left) and _is_mask(node.right)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        return _is_mask(node.operand)
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in MASK_METHODS):
+        return False
+    receiver = node.func.value
+    if isinstance(receiver, ast.Attribute) and receiver.attr == "str":
+        receiver = receiver.value  # df.name.str.contains(...)
+    if node.func.attr == "duplicated" and isinstance(receiver, ast.Name) and receiver.id == "df":
+        return True  # DataFrame.duplicated is a row mask
+    return _column_ref(receiver) is not None
+
+
+def _groupby_parts(node):
+    """`X.groupby(...)` passing nothing but the keys, as (X, args, keywords).
+
+    Other keywords (as_index, group_keys, dropna, ...) change the result's
+    shape in ways the rewrites don't reproduce, so those calls are left alone.
+    """
+    parts = _call_parts(node, "groupby")
+    if parts is None or any(kw.arg != "by" for kw in parts[2]):
+        return None
+    return parts
+
+
+def _is_series_groupby(node):
+    """`X.groupby(...)['col']`"""
+    return (isinstance(node, ast.Subscript) and _groupby_parts(node.value) is not None
+            and _is_const(node.slice, str))
+
+
+def _builtin_for(func):
+    """Name of the built-in groupby aggregation equivalent to an apply/agg callable"""
+    if (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "np"
+            and func.attr in NP_AGGREGATIONS):
+        return func.attr
+    if isinstance(func, ast.Name) and func.id == "len":
+        return "size"
+    if not (isinstance(func, ast.Lambda) and len(func.args.args) == 1 and not func.args.defaults):
+        return None
+    arg = func.args.args[0].arg
+    body = func.body
+    if not isinstance(body, ast.Call) or body.keywords:
+        return None
+    is_arg = lambda n: isinstance(n, ast.Name) and n.id == arg
+    # lambda v: v.sum()
+    if isinstance(body.func, ast.Attribute) and is_arg(body.func.value) and not body.args \
+            and body.func.attr in AGGREGATIONS:
+        return body.func.attr
+    # lambda v: np.sum(v) / len(v)
+    if len(body.args) == 1 and is_arg(body.args[0]):
+        if isinstance(body.func, ast.Name) and body.func.id == "len":
+            return "size"
+        return _builtin_for(body.func) if isinstance(body.func, ast.Attribute) else None
+    return None
+
+
+def _group_column(func):
+    """For `lambda g: ...` that only uses one column of the group (`g['c']` or
+    `g.c`), return (c, the same lambda applied to the column instead)"""
+    if not (isinstance(func, ast.Lambda) and len(func.args.args) == 1 and not func.args.defaults):
+        return None
+    arg = func.args.args[0].arg
+    columns = []
+
+    class ColumnUse(ast.NodeTransformer):
+        def visit_Subscript(self, node):
+            if isinstance(node.value, ast.Name) and node.value.id == arg and _is_const(node.slice, str):
+                columns.append(node.slice.value)
+                return ast.Name(arg, ast.Load())
+            return self.generic_visit(node)
+
+        def visit_Attribute(self, node):
+            if (isinstance(node.value, ast.Name) and node.value.id == arg
+                    and not hasattr(pd.DataFrame, node.attr)):
+                columns.append(node.attr)
+                return ast.Name(arg, ast.Load())
+            return self.generic_visit(node)
+
+    body = ColumnUse().visit(copy.deepcopy(func.body))
+    uses = sum(isinstance(n, ast.Name) and n.id == arg for n in ast.walk(func.body))
+    # Every use of the group must select the same column
+    if not columns or len(set(columns)) != 1 or len(columns) != uses:
+        return None
+    return columns[0], ast.Lambda(args=func.args, body=body)
+
+
+class ExpressionOptimizer(ast.NodeTransformer):
+    """Rewrite wasteful pandas expression shapes into cheaper equivalents.
+
+    - `X.sort_values(c, ascending=...).head(n)` -> nlargest/nsmallest (via topk)
+    - `df[m1][m2]` -> `df[(m1) & (m2)]`, one mask instead of an intermediate copy
+    - `X.groupby(k).agg()[c]` -> `X.groupby(k)[c].agg()`, aggregating only c (via
+      pruned_aggregate, when no other column would make the aggregation fail)
+    - `X.groupby(k)[c].apply(lambda v: v.sum())` -> `X.groupby(k)[c].sum()`
+    - `X.groupby(k).apply(lambda g: g[c].sum())` -> `X.groupby(k)[c].sum()` (unnamed, like
+      apply's result), and `X.groupby(k).apply(len)` -> `X.groupby(k).size()`
+    """
+
+    def __init__(self):
+        self.rewrites = []
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        return self._rewrite_topk(node) or self._rewrite_apply(node) or node
+
+    def visit_Subscript(self, node):
+        self.generic_visit(node)
+        return self._rewrite_chained_masks(node) or self._rewrite_groupby_selection(node) or node
+
+    def _rewrite_topk(self, node):
+        head = _call_parts(node, "head")
+        if head is None:
+            return None
+        sorted_node, head_args, head_kw = head
+        if head_kw or len(head_args) > 1:
+            return None
+        n = head_args[0] if head_args else ast.Constant(5)
+        if not _is_const(n, int):
+            return None
+
+        sort = _call_parts(sorted_node, "sort_values")
+        if sort is None:
+            return None
+        obj, sort_args, sort_kw = sort
+        by = sort_args[0] if sort_args else ast.Constant(None)
+        ascending = ast.Constant(True)
+        for kw in sort_kw:
+            if kw.arg == "by" and not sort_args:
+                by = kw.value
+            elif kw.arg == "ascending" and _is_const(kw.value, bool):
+                ascending = kw.value
+            else:
+                return None  # na_position, key, kind, ... change semantics
+        if len(sort_args) > 1 or not (_is_const(by, str) or (isinstance(by, ast.Constant) and by.value is None)):
+            return None
+
+        self.rewrites.append("top-k")
+        return ast.Call(func=ast.Name("_topk", ast.Load()), args=[obj, n, by, ascending], keywords=[])
+
+    def _rewrite_chained_masks(self, node):
+        inner = node.value
+        if not (isinstance(inner, ast.Subscript) and isinstance(inner.value, ast.Name) and inner.value.id == "df"):
+            return None
+        if not (_is_mask(inner.slice) and _is_mask(node.slice)):
+            return None
+        self.rewrites.append("combined-mask")
+        combined = ast.BinOp(left=inner.slice, op=ast.BitAnd(), right=node.slice)
+        return ast.Subscript(value=inner.value, slice=combined, ctx=node.ctx)
+
+    def _rewrite_groupby_selection(self, node):
+        if not _is_column_selector(node.slice) or not isinstance(node.value, ast.Call):
+            return None
+        agg = node.value
+        if not isinstance(agg.func, ast.Attribute) or agg.func.attr not in AGGREGATIONS or agg.args or agg.keywords:
+            return None
+        grouped = agg.func.value
+        if _groupby_parts(grouped) is None:
+            return None
+        self.rewrites.append("prune-before-groupby")
+        return ast.Call(func=ast.Name("_pruned_aggregate", ast.Load()),
+                        args=[grouped, node.slice, ast.Constant(agg.func.attr)], keywords=[])
+
+    def _rewrite_apply(self, node):
+        for method in ("apply", "agg", "aggregate"):
+            parts = _call_parts(node, method)
+            if parts is not None:
+                break
+        else:
+            return None
+        receiver, args, keywords = parts
+        if keywords or len(args) != 1:
+            return None
+        if method == "apply" and _groupby_parts(receiver) is not None:
+            return self._rewrite_frame_apply(receiver, args[0])
+        if not _is_series_groupby(receiver):
+            return None
+        builtin = _builtin_for(args[0])
+        if builtin is None:
+            return None
+        self.rewrites.append("builtin-aggregation")
+        return ast.Call(func=ast.Attribute(value=receiver, attr=builtin, ctx=ast.Load()), args=[], keywords=[])
+
+    def _rewrite_frame_apply(self, grouped, func):
+        """`X.groupby(k).apply(func)` where func aggregates the group's size or one of its columns"""
+        if _builtin_for(func) == "size":
+            self.rewrites.append("builtin-aggregation")
+            return ast.Call(func=ast.Attribute(value=grouped, attr="size", ctx=ast.Load()), args=[], keywords=[])
+        column = _group_column(func)
+        if column is None:
+            return None
+        name, column_func = column
+        builtin = _builtin_for(column_func)
+        if builtin is None:
+            return None
+        self.rewrites.append("builtin-aggregation")
+        selected = ast.Subscript(value=grouped, slice=ast.Constant(name), ctx=ast.Load())
+        aggregated = ast.Call(func=ast.Attribute(value=selected, attr=builtin, ctx=ast.Load()), args=[], keywords=[])
+        # apply names its result after nothing; the column aggregation after the column
+        return ast.Call(func=ast.Attribute(value=aggregated, attr="rename", ctx=ast.Load()),
+                        args=[ast.Constant(None)], keywords=[])
+
+
+def optimize_expression(tree):
+    """Optimize a parsed `mode="eval"` tree; returns (tree, list of applied rewrites)"""
+    optimizer = ExpressionOptimizer()
+    tree = ast.fix_missing_locations(optimizer.visit(tree))
+    return tree, optimizer.rewrites
+
+
+# -------------------------
+# numexpr fast path
+# -------------------------
+_COMPARE_OPS = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!="}
+# No %: numexpr uses C fmod semantics for negative operands, Python doesn't
+_ARITH_OPS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.Pow: "**"}
+_MASK_OPS = {ast.BitAnd: "&", ast.BitOr: "|"}
+
+
+def _column_ref(node):
+    """Column name for `df['col']` or `df.col`, else None"""
+    if not (isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.value, ast.Name)
+            and node.value.id == "df"):
+        return None
+    if isinstance(node, ast.Subscript):
+        return node.slice.value if _is_const(node.slice, str) else None
+    # Attribute access only means a column when it doesn't shadow a DataFrame attribute
+    return None if hasattr(pd.DataFrame, node.attr) else node.attr
+
+
+def _is_comparison_mask(node):
+    """Comparisons combined with & | ~, so the value is always a boolean row mask"""
+    if isinstance(node, ast.Compare):
+        return True
+    if isinstance(node, ast.BinOp) and type(node.op) in _MASK_OPS:
+        return _is_comparison_mask(node.left) and _is_comparison_mask(node.right)
+    return isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert) and _is_comparison_mask(node.operand)
+
+
+def _to_numexpr(node, columns, ops):
+    """Render a column/constant expression as numexpr text.
+
+    Columns become `_c<i>` variables (numexpr names must be identifiers);
+    columns and ops collect the referenced column names and operator kinds.
+    """
+    col = _column_ref(node)
+    if col is not None:
+        if col not in columns:
+            columns.append(col)
+        return f"_c{columns.index(col)}"
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return repr(node.value)
+    # Booleans and numbers are never mixed: & | ~ only combine comparisons, which only compare values
+    if _is_comparison_mask(node):
+        if isinstance(node, ast.Compare):
+            if len(node.ops) != 1 or type(node.ops[0]) not in _COMPARE_OPS \
+                    or _is_comparison_mask(node.left) or _is_comparison_mask(node.comparators[0]):
+                return None
+            ops.append("compare")
+            left = _to_numexpr(node.left, columns, ops)
+            right = _to_numexpr(node.comparators[0], columns, ops)
+            return f"({left} {_COMPARE_OPS[type(node.ops[0])]} {right})" if left and right else None
+        ops.append("mask")
+        if isinstance(node, ast.UnaryOp):
+            operand = _to_numexpr(node.operand, columns, ops)
+            return f"~{operand}" if operand else None
+        left = _to_numexpr(node.left, columns, ops)
+        right = _to_numexpr(node.right, columns, ops)
+        return f"({left} {_MASK_OPS[type(node.op)]} {right})" if left and right else None
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITH_OPS:
+        if _is_comparison_mask(node.left) or _is_comparison_mask(node.right):
+            return None
+        ops.append("arith")
+        left = _to_numexpr(node.left, columns, ops)
+        right = _to_numexpr(node.right, columns, ops)
+        return f"({left} {_ARITH_OPS[type(node.op)]} {right})" if left and right else None
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and not _is_comparison_mask(node.operand):
+        ops.append("arith")
+        operand = _to_numexpr(node.operand, columns, ops)
+        return f"-{operand}" if operand else None
+    return None
+
+
+def numexpr_plan(tree):
+    """Plan for evaluating a row filter or column arithmetic in one numexpr pass.
+
+    Returns ("filter", text, columns) for `df[<mask>]` and ("eval", text, columns)
+    for an arithmetic Series expression, or None when the expression doesn't fit
+    or numexpr isn't faster for it: pandas runs single operations and comparison
+    masks as fast, and masks joined with & or | faster; the win comes from fusing
+    arithmetic (benchmarks/numexpr_fastpath.py times each shape).
+    """
+    body = tree.body
+    columns, ops = [], []
+    if isinstance(body, ast.Subscript) and isinstance(body.value, ast.Name) and body.value.id == "df" \
+            and _is_comparison_mask(body.slice):
+        kind, text = "filter", _to_numexpr(body.slice, columns, ops)
+    elif isinstance(body, (ast.BinOp, ast.UnaryOp)) and not _is_comparison_mask(body):
+        kind, text = "eval", _to_numexpr(body, columns, ops)
+    else:
+        return None
+    if not text or not columns or "arith" not in ops or "mask" in ops or len(ops) < 2:
+        return None
+    return kind, text, tuple(columns)
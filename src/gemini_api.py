@@ -1,39 +1,169 @@
-import requests
-from config import GEMINI_API_KEY, MODEL_PRIORITY
+import hashlib
+import threading
+import time
+from tracing import span
+from model_router import model_router
+from config import GEMINI_API_KEY, PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_TTL, API_REQUESTS_PER_MINUTE
 
-def call_gemini(model_name, system_prompt, user_prompt):
-    """Call Gemini API with error handling"""
+API_BASE = "https://generativelanguage.googleapis.com"
+
+# Context caches created for static prompt prefixes: {(model, prefix_hash): (name or None, expires_at)}
+_context_caches = {}
+_context_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` requests per minute (bursts up to that many); 0 disables"""
+
+    def __init__(self, per_minute=0):
+        self.per_minute = per_minute
+        self._tokens = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        if not self.per_minute:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.per_minute, self._tokens + (now - self._updated) * self.per_minute / 60)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * 60 / self.per_minute
+            time.sleep(wait)
+
+
+_rate_limiter = RateLimiter(API_REQUESTS_PER_MINUTE)
+
+
+def set_rate_limit(per_minute):
+    """Limit API requests per minute across all threads (0 for no limit)"""
+    global _rate_limiter
+    _rate_limiter = RateLimiter(per_minute)
+
+
+def _throttle():
+    with span("gemini.rate_limit"):
+        _rate_limiter.acquire()
+
+
+def _get_context_cache(model_name, system_prompt):
+    """Return the name of an API context cache holding system_prompt, creating it if needed.
+
+    Returns None when the prefix is below the model's caching minimum or the
+    cache cannot be created; failures are remembered for the TTL so they are
+    not retried on every question.
+    """
+    if len(system_prompt) // 4 < PROMPT_CACHE_MIN_TOKENS:
+        return None
+    
+    key = (model_name, hashlib.sha256(system_prompt.encode("utf-8")).hexdigest())
+    now = time.time()
+    with _context_lock:
+        cached = _context_caches.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+    
+    import requests
+    name = None
+    try:
+        _throttle()
+        response = requests.post(
+            f"{API_BASE}/v1beta/cachedContents?key={GEMINI_API_KEY}",
+            json={
+                "model": f"models/{model_name}",
+                "systemInstruction": {"parts": [{"text": system_prompt}]},
+                "ttl": f"{PROMPT_CACHE_TTL}s",
+            },
+            timeout=30,
+        )
+        if response.status_code == 200:
+            name = response.json().get("name")
+    except Exception:
+        pass
+    
+    with _context_lock:
+        # Expire slightly early so a cache is never referenced after the server drops it
+        _context_caches[key] = (name, now + PROMPT_CACHE_TTL - 30)
+    return name
+
+
+def call_gemini(model_name, system_prompt, user_prompt, cache_system_prompt=False):
+    """Call Gemini API with error handling.
+
+    With cache_system_prompt, a static system prompt is sent once as an API
+    context cache and later calls only send the user prompt. Returns (status,
+    response JSON, seconds): seconds is the generateContent round trip alone,
+    without rate-limit waits or context-cache creation, for latency routing.
+    """
     if not GEMINI_API_KEY:
-        return -1, {"error": "API key not configured"}
+        return -1, {"error": "API key not configured"}, 0.0
+    import requests  # deferred: not needed until the first question
+    
+    if cache_system_prompt:
+        with span("gemini.context_cache"):
+            cache_name = _get_context_cache(model_name, system_prompt)
+    else:
+        cache_name = None
+    generation_config = {"temperature": 0.1, "maxOutputTokens": 2048}
     
-    url = f"https://generativelanguage.googleapis.com/v1/models/{model_name}:generateContent?key={GEMINI_API_KEY}"
-    body = {
-        "contents": [{"parts": [{"text": system_prompt + "\n\nUSER:\n" + user_prompt}]}],
-        "generationConfig": {"temperature": 0.1, "maxOutputTokens": 2048},
-    }
+    if cache_name:
+        url = f"{API_BASE}/v1beta/models/{model_name}:generateContent?key={GEMINI_API_KEY}"
+        body = {
+            "cachedContent": cache_name,
+            "contents": [{"role": "user", "parts": [{"text": user_prompt}]}],
+            "generationConfig": generation_config,
+        }
+    else:
+        url = f"{API_BASE}/v1/models/{model_name}:generateContent?key={GEMINI_API_KEY}"
+        body = {
+            "contents": [{"parts": [{"text": system_prompt + "\n\nUSER:\n" + user_prompt}]}],
+            "generationConfig": generation_config,
+        }
     
+    start = time.perf_counter()
     try:
+        _throttle()
+        start = time.perf_counter()
         response = requests.post(url, json=body, timeout=30)
-        return response.status_code, response.json()
+        seconds = time.perf_counter() - start
+        if cache_name and response.status_code in (400, 403, 404):
+            # Cache expired or was rejected; forget it and send the full prompt
+            with _context_lock:
+                for key, (name, _) in list(_context_caches.items()):
+                    if name == cache_name:
+                        _context_caches[key] = (None, time.time() + PROMPT_CACHE_TTL)
+            status, payload, retry_seconds = call_gemini(model_name, system_prompt, user_prompt)
+            return status, payload, seconds + retry_seconds
+        return response.status_code, response.json(), seconds
     except requests.exceptions.Timeout:
-        return -1, {"error": "Request timeout"}
+        return -1, {"error": "Request timeout"}, time.perf_counter() - start
     except Exception as e:
-        return -1, {"error": str(e)}
+        return -1, {"error": str(e)}, time.perf_counter() - start
 
 
-def call_gemini_auto(system_prompt, user_prompt):
-    """Auto-fallback through model list"""
-    for model in MODEL_PRIORITY:
-        status, response = call_gemini(model, system_prompt, user_prompt)
+def call_gemini_auto(system_prompt, user_prompt, cache_system_prompt=False):
+    """Try models in the router's order (best recent latency/success first) until one answers"""
+    for model in model_router.order():
+        with span("gemini.request", model=model):
+            status, response, seconds = call_gemini(model, system_prompt, user_prompt, cache_system_prompt)
+        usage = response.get("usageMetadata") if isinstance(response, dict) else None
         
         if status == 200 and isinstance(response, dict):
             try:
                 text = response["candidates"][0]["content"]["parts"][0]["text"]
+                model_router.record(model, seconds, True, usage)
                 return model, text
             except (KeyError, IndexError):
+                model_router.record(model, seconds, False, usage)
                 continue
         
+        model_router.record(model, seconds, False, usage)
         if status in [500, 503]:  # Server errors, try next model
             continue
     
-    return None, "<chat>All models unavailable. Please check your API key and try again.</chat>"
\ No newline at end of file
+    return None, "<chat>All models unavailable. Please check your API key and try again.</chat>"
@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from config import INSIGHT_WORKERS
+from gemini_api import call_gemini_auto
+from prompt_builder import column_profile
+from result_cache import dataset_version
+
+FACETS = {
+    "quality": "Data Quality",
+    "distributions": "Distributions",
+    "correlations": "Correlations",
+    "outliers": "Outliers",
+}
+
+_MAX_COLUMNS = 15
+_CACHE_ENTRIES = 16
+
+# Finished facet texts and computed statistics, keyed by dataset version
+_insight_cache = OrderedDict()
+_stats_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cached(cache, key, compute):
+    with _cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    value = compute()
+    with _cache_lock:
+        cache[key] = value
+        while len(cache) > _CACHE_ENTRIES:
+            cache.popitem(last=False)
+    return value
+
+
+def _compute_stats(df):
+    """One pass of summary statistics shared by all facets"""
+    numeric = df.select_dtypes(include=["number"]).iloc[:, :_MAX_COLUMNS * 2]
+    stats = {"rows": len(df), "cols": len(df.columns)}
+
+    nulls = (df.isnull().mean() * 100).round(1)
+    stats["nulls"] = nulls[nulls > 0].sort_values(ascending=False).head(_MAX_COLUMNS)
+    try:
+        stats["duplicates"] = int(df.duplicated().sum())
+        stats["constant"] = [c for c in df.columns if df[c].nunique(dropna=True) <= 1] if len(df) else []
+    except TypeError:
+        stats["duplicates"], stats["constant"] = None, []  # unhashable cells
+
+    if not numeric.empty:
+        describe = numeric.describe().T
+        describe["skew"] = numeric.skew(numeric_only=True)
+        stats["describe"] = describe.iloc[:_MAX_COLUMNS].round(3)
+
+        q1, q3 = numeric.quantile(0.25), numeric.quantile(0.75)
+        iqr = q3 - q1
+        outside = (numeric.lt(q1 - 1.5 * iqr) | numeric.gt(q3 + 1.5 * iqr)).sum()
+        stats["outliers"] = pd.DataFrame({
+            "iqr_outliers": outside,
+            "pct": (outside / max(len(numeric), 1) * 100).round(2),
+            "min": numeric.min(),
+            "max": numeric.max(),
+        }).sort_values("iqr_outliers", ascending=False).head(_MAX_COLUMNS)
+
+        if len(numeric.columns) > 1:
+            corr = numeric.corr()
+            mask = np.triu(np.ones(corr.shape, dtype=bool), k=1)
+            pairs = corr.where(mask).stack().dropna()
+            stats["correlations"] = pairs.reindex(pairs.abs().sort_values(ascending=False).index).head(10).round(3)
+    return stats
+
+
+def dataset_stats(df):
+    """Summary statistics for insights, computed once per dataset version"""
+    return _cached(_stats_cache, dataset_version(df), lambda: _compute_stats(df))
+
+
+def _facet_context(facet, df, stats):
+    """Compact statistics text for one facet"""
+    if facet == "quality":
+        lines = [f"{stats['rows']:,} rows x {stats['cols']} columns"]
+        if stats["duplicates"] is not None:
+            lines.append(f"Duplicate rows: {stats['duplicates']:,}")
+        lines.append("Null % by column: " + (", ".join(f"{c}={v}" for c, v in stats["nulls"].items()) or "none"))
+        if stats["constant"]:
+            lines.append("Constant columns: " + ", ".join(map(str, stats["constant"][:_MAX_COLUMNS])))
+        return "\n".join(lines)
+
+    if facet == "distributions":
+        parts = []
+        if "describe" in stats:
+            parts.append(stats["describe"].to_string())
+        profile = column_profile(df)
+        text_cols = [c for c, e in profile.items() if e["values"]][:_MAX_COLUMNS]
+        for col in text_cols:
+            values = profile[col]["values"]
+            parts.append(f"{col}: most common {', '.join(map(str, values[:5]))}")
+        return "\n".join(parts) or "No columns to describe"
+
+    if facet == "correlations":
+        if "correlations" not in stats:
+            return "Fewer than 2 numeric columns"
+        return "\n".join(f"{a} ~ {b}: {v}" for (a, b), v in stats["correlations"].items())
+
+    if facet == "outliers":
+        if "outliers" not in stats:
+            return "No numeric columns"
+        return stats["outliers"].to_string()
+
+    raise ValueError(f"Unknown insight facet: {facet}")
+
+
+def _run_facet(facet, context, schema):
+    """(model, text) for one facet; model is None when no model answered"""
+    prompt = f"""Analyze the {FACETS[facet].lower()} of this dataset and provide 2-3 key insights in bullet points.
+
+Dataset Info:
+{schema}
+
+{FACETS[facet]} Statistics:
+{context}
+
+Keep each insight concise (1-2 sentences). Mention potential issues and a recommendation if relevant."""
+    return call_gemini_auto("You are a data analyst providing insights.", prompt)
+
+
+def generate_insights_stream(df, schema):
+    """Yield (facet, title, text) as each facet's insights complete.
+
+    Facets are sent as concurrent small requests built from cached statistics;
+    finished facets are cached per dataset version and returned immediately.
+    """
+    version = dataset_version(df)
+    stats = dataset_stats(df)
+
+    pending = []
+    for facet in FACETS:
+        with _cache_lock:
+            text = _insight_cache.get((version, facet))
+        if text is not None:
+            yield facet, FACETS[facet], text
+        else:
+            pending.append(facet)
+
+    if not pending:
+        return
+
+    with ThreadPoolExecutor(max_workers=INSIGHT_WORKERS) as executor:
+        futures = {
+            executor.submit(_run_facet, facet, _facet_context(facet, df, stats), schema): facet
+            for facet in pending
+        }
+        for future in as_completed(futures):
+            facet = futures[future]
+            try:
+                model, text = future.result()
+            except Exception as e:
+                yield facet, FACETS[facet], f"Error generating insights: {str(e)}"
+                continue
+            if model is not None:  # failures aren't cached, so the next run retries them
+                _cached(_insight_cache, (version, facet), lambda: text)
+            yield facet, FACETS[facet], text
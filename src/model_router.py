@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+
+from config import (
+    MODEL_PRIORITY,
+    MODEL_QUALITY,
+    ROUTER_QUALITY_FLOOR,
+    ROUTER_LATENCY_WEIGHT,
+    ROUTER_ERROR_WEIGHT,
+    ROUTER_WINDOW,
+    ROUTER_WINDOW_SECONDS,
+)
+
+
+class ModelRouter:
+    """Order models by recent latency and error rate, and account usage per model.
+
+    Each model keeps its last `window` outcomes younger than `window_seconds`.
+    Its score is latency_weight * median latency (s) + error_weight * error
+    rate; lower goes first. A model with no recent outcomes scores 0 so it is
+    re-probed once its old results age out, and ties keep MODEL_PRIORITY order.
+    Models below the quality floor are only used when no model meets it.
+    """
+
+    def __init__(self, models=MODEL_PRIORITY, quality=MODEL_QUALITY, quality_floor=ROUTER_QUALITY_FLOOR,
+                 latency_weight=ROUTER_LATENCY_WEIGHT, error_weight=ROUTER_ERROR_WEIGHT,
+                 window=ROUTER_WINDOW, window_seconds=ROUTER_WINDOW_SECONDS):
+        self.models = list(models)
+        self.quality = quality
+        self.quality_floor = quality_floor
+        self.latency_weight = latency_weight
+        self.error_weight = error_weight
+        self.window_seconds = window_seconds
+        self._outcomes = {m: deque(maxlen=window) for m in self.models}  # (timestamp, seconds, ok)
+        self._usage = {m: {"requests": 0, "errors": 0, "prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+                       for m in self.models}
+        self._lock = threading.Lock()
+
+    def _recent(self, model, now):
+        outcomes = self._outcomes[model]
+        while outcomes and now - outcomes[0][0] > self.window_seconds:
+            outcomes.popleft()
+        return list(outcomes)
+
+    def _score(self, model, now):
+        recent = self._recent(model, now)
+        if not recent:
+            return 0.0
+        latencies = sorted(seconds for _, seconds, ok in recent if ok)
+        error_rate = sum(not ok for _, _, ok in recent) / len(recent)
+        # A model that only failed recently has no latency; rank it by errors alone
+        latency = latencies[len(latencies) // 2] if latencies else 0.0
+        return self.latency_weight * latency + self.error_weight * error_rate
+
+    def order(self):
+        """Models to try, best recent profile first"""
+        eligible = [m for m in self.models if self.quality.get(m, 0) >= self.quality_floor] or self.models
+        now = time.monotonic()
+        with self._lock:
+            scores = {m: self._score(m, now) for m in eligible}
+        return sorted(eligible, key=lambda m: (scores[m], self.models.index(m)))
+
+    def record(self, model, seconds, ok, usage=None):
+        """Record one request's outcome and its usageMetadata (if any)"""
+        with self._lock:
+            if model not in self._outcomes:
+                return
+            self._outcomes[model].append((time.monotonic(), seconds, ok))
+            totals = self._usage[model]
+            totals["requests"] += 1
+            totals["errors"] += not ok
+            usage = usage or {}
+            totals["prompt_tokens"] += usage.get("promptTokenCount", 0)
+            totals["output_tokens"] += usage.get("candidatesTokenCount", 0)
+            totals["cached_tokens"] += usage.get("cachedContentTokenCount", 0)
+
+    def stats(self):
+        """Per-model usage totals with recent median latency, error rate and score"""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for model in self.models:
+                recent = self._recent(model, now)
+                latencies = sorted(seconds for _, seconds, ok in recent if ok)
+                result[model] = dict(
+                    self._usage[model],
+                    latency=latencies[len(latencies) // 2] if latencies else None,
+                    error_rate=sum(not ok for _, _, ok in recent) / len(recent) if recent else None,
+                    score=self._score(model, now),
+                    eligible=self.quality.get(model, 0) >= self.quality_floor,
+                )
+        return result
+
+
+model_router = ModelRouter()
@@ -0,0 +1,259 @@
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import PROMPT_TOKEN_BUDGET, PROMPT_PREFIX_TOKEN_BUDGET
+from result_cache import dataset_version
+
+_WORD = re.compile(r"[a-z0-9]+")
+_MAX_CELL_CHARS = 30
+_PROFILE_VALUES = 200
+_TABLE_COLUMNS = 30  # columns listed per other workspace dataset
+
+# Per-dataset static prefixes and column profiles, keyed by dataset version
+_prefix_cache = OrderedDict()
+_profile_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_ENTRIES = 16
+
+INSTRUCTIONS = """You are a data analysis assistant. Analyze the user's query and respond using EXACTLY one of these XML formats:
+
+1) <chat>...</chat> - For general questions, explanations, or when you need clarification
+2) <pandas>...</pandas> - For pandas operations that return DataFrames or values
+3) <sql>...</sql> - For SQL queries (table name is 'data')
+
+IMPORTANT RULES:
+- Always wrap your code in the appropriate XML tags
+- For pandas: write valid Python pandas code that works with variable 'df'
+- For SQL: write valid SQL for a table named 'data'
+- Add <explain>...</explain> after pandas/SQL to explain what the code does
+- Keep explanations concise and clear"""
+
+EXAMPLES = """EXAMPLES:
+
+User: "show me the first 10 rows"
+Response: <pandas>df.head(10)</pandas><explain>Displays the first 10 rows of the dataset</explain>
+
+User: "what's the average price?"
+Response: <pandas>df['price'].mean()</pandas><explain>Calculates the mean of the price column</explain>
+
+User: "filter rows where sales > 1000"
+Response: <pandas>df[df['sales'] > 1000]</pandas><explain>Filters the dataset to show only rows where sales exceed 1000</explain>
+
+User: "group by category and sum revenue"
+Response: <pandas>df.groupby('category')['revenue'].sum()</pandas><explain>Groups data by category and sums the revenue for each group</explain>
+
+User: "what columns are available?"
+Response: <chat>The dataset has the following columns: {columns}...</chat>"""
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English and code)"""
+    return len(text) // 4 + 1
+
+
+def _remember(cache, key, value):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > _CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+
+def _lookup(cache, key):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _short(value):
+    text = str(value)
+    return text if len(text) <= _MAX_CELL_CHARS else text[:_MAX_CELL_CHARS - 1] + "…"
+
+
+def column_profile(df):
+    """Compact per-column summary computed once per dataset version.
+
+    Text columns keep their most frequent values (for matching question words),
+    numeric columns their range.
+    """
+    key = dataset_version(df)
+    profile = _lookup(_profile_cache, key)
+    if profile is not None:
+        return profile
+
+    profile = {col: _profile_column(df[col]) for col in df.columns}
+    _remember(_profile_cache, key, profile)
+    return profile
+
+
+def _profile_column(series):
+    if not isinstance(series, pd.Series):  # duplicate column name
+        return {"dtype": "mixed", "values": [], "counts": [], "range": None}
+    entry = {"dtype": str(series.dtype), "values": [], "counts": [], "range": None}
+    try:
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            if series.notna().any():
+                entry["range"] = (series.min(), series.max())
+        else:
+            top = series.dropna().astype(str).value_counts().head(_PROFILE_VALUES)
+            entry["values"] = top.index.tolist()
+            entry["counts"] = top.tolist()
+    except TypeError:
+        pass  # unhashable cells (lists/dicts from NoSQL sources)
+    return entry
+
+
+def extend_profile(old_df, new_rows, df):
+    """Profile df (old_df with new_rows appended) from old_df's cached profile plus the new rows.
+
+    Only the appended rows are scanned; value counts are merged over the kept
+    top values, so rarely seen values may be undercounted. Columns whose dtype
+    changed are profiled again. No-op when old_df has no cached profile.
+    """
+    old = _lookup(_profile_cache, dataset_version(old_df))
+    if old is None:
+        return
+    profile = {}
+    for col in df.columns:
+        entry = old.get(col)
+        if entry is None or col not in new_rows.columns or entry["dtype"] != str(df[col].dtype):
+            profile[col] = _profile_column(df[col])
+            continue
+        added = _profile_column(new_rows[col])
+        ranges = [r for r in (entry["range"], added["range"]) if r is not None]
+        counts = dict(zip(entry["values"], entry["counts"]))
+        for value, count in zip(added["values"], added["counts"]):
+            counts[value] = counts.get(value, 0) + count
+        top = sorted(counts.items(), key=lambda vc: -vc[1])[:_PROFILE_VALUES]
+        profile[col] = {
+            "dtype": entry["dtype"],
+            "values": [v for v, _ in top],
+            "counts": [c for _, c in top],
+            "range": (min(r[0] for r in ranges), max(r[1] for r in ranges)) if ranges else None,
+        }
+    _remember(_profile_cache, dataset_version(df), profile)
+
+
+def _score_columns(profile, question):
+    """Score columns by name and value overlap with the question"""
+    words = set(_WORD.findall(question.lower()))
+    text = question.lower()
+    scores = {}
+    for col, entry in profile.items():
+        name = str(col).lower()
+        name_words = set(_WORD.findall(name))
+        score = 0
+        if name in text or name.replace("_", " ") in text:
+            score += 3
+        score += len(name_words & words)
+        for value in entry["values"]:
+            value = str(value).lower()
+            if len(value) >= 3 and (value in words or (" " in value and value in text)):
+                score += 2
+                break
+        scores[col] = score
+    return scores
+
+
+def _describe_column(col, entry):
+    line = f"- {col} ({entry['dtype']})"
+    if entry["range"] is not None:
+        low, high = entry["range"]
+        line += f": range {_short(low)} .. {_short(high)}"
+    elif entry["values"]:
+        line += ": e.g. " + ", ".join(_short(v) for v in entry["values"][:3])
+    return line
+
+
+def describe_tables(df, tables):
+    """One compact line per other workspace dataset, columns shared with df (likely join keys) first"""
+    own = {str(c) for c in df.columns}
+    lines = []
+    for name, table in tables.items():
+        columns = sorted(((str(c), dtype) for c, dtype in table.dtypes.items()), key=lambda cd: cd[0] not in own)
+        shared = [c for c, _ in columns if c in own]
+        listed = ", ".join(f"{c} ({dtype})" for c, dtype in columns[:_TABLE_COLUMNS])
+        if len(columns) > _TABLE_COLUMNS:
+            listed += ", ..."
+        line = f"- {name} ({len(table):,} rows"
+        if shared:
+            line += "; shares " + ", ".join(shared[:5]) + " with df"
+        lines.append(line + f"): {listed}")
+    return "\n".join(lines)
+
+
+def describe_previous(question, result):
+    """Prompt section for the previous answer's result, available as `prev`"""
+    columns = [f"{c} ({dtype})" for c, dtype in result.dtypes.items()]
+    listed = ", ".join(columns[:_TABLE_COLUMNS]) + (", ..." if len(columns) > _TABLE_COLUMNS else "")
+    return (f'Previous result, for "{question}" ({len(result):,} rows): {listed}\n'
+            "If the query refines or follows up on that result (e.g. \"now only 2023\", \"sort those\"), "
+            "use `prev` in pandas or table prev in SQL instead of df/data; otherwise ignore it.")
+
+
+def build_static_prefix(df, schema, tables=None):
+    """Instructions, dataset schema and examples; identical for every question on a dataset.
+
+    tables ({name: df}) are other workspace datasets generated code can join with.
+    Keeping this text stable lets it be reused via API context caching (and the
+    provider's implicit prefix caching) across turns.
+    """
+    tables = tables or {}
+    key = (dataset_version(df), schema, tuple((name, dataset_version(t)) for name, t in tables.items()))
+    prefix = _lookup(_prefix_cache, key)
+    if prefix is not None:
+        return prefix
+
+    columns = [str(c) for c in df.columns]
+    column_list = ", ".join(columns)
+    parts = [INSTRUCTIONS, f"Dataset Information:\n{schema}"]
+    if df.attrs.get("sqlite_source"):
+        parts.append("SQL on 'data' reads the whole source table in place, not just the loaded rows; "
+                     "prefer SQL for totals and counts over the full table.")
+    if tables:
+        parts.append("Other datasets (in pandas use each by its name like df; in SQL query it by name "
+                     "and join it with data):\n" + describe_tables(df, tables))
+    fixed = estimate_tokens("\n\n".join(parts)) + estimate_tokens(EXAMPLES)
+    if len(columns) > 15:
+        budget_chars = max(0, (PROMPT_PREFIX_TOKEN_BUDGET - fixed) * 4)
+        if len(column_list) > budget_chars:
+            column_list = column_list[:budget_chars].rsplit(", ", 1)[0] + ", ..."
+        parts.append(f"All columns: {column_list}")
+    parts.append(EXAMPLES.format(columns=", ".join(columns[:5])))
+    prefix = "\n\n".join(parts)
+
+    _remember(_prefix_cache, key, prefix)
+    return prefix
+
+
+def build_question_prompt(df, question, budget=PROMPT_TOKEN_BUDGET, prev=None):
+    """Per-question context: the most relevant columns with compact samples, then the question.
+
+    prev is the (question, result) of the previous answer, which a follow-up
+    that refines it can query as `prev` instead of rescanning df.
+    """
+    profile = column_profile(df)
+    scores = _score_columns(profile, question)
+    ordered = sorted(profile, key=lambda c: -scores[c])  # stable: ties keep table order
+
+    tail = f"\n\nNow respond to the user's query:\n{question}"
+    if prev is not None:
+        tail = "\n\n" + describe_previous(*prev) + tail
+    used = estimate_tokens(tail) + estimate_tokens("Relevant columns:\n")
+    lines = []
+    for col in ordered:
+        line = _describe_column(col, profile[col])
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            if scores[col] > 0:
+                continue
+            break
+        lines.append(line)
+        used += cost
+
+    return "Relevant columns:\n" + "\n".join(lines) + tail
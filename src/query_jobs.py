@@ -0,0 +1,91 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import QUERY_WORKERS, QUERY_TIMEOUT
+
+# Shared by all sessions so concurrent users can't spawn unbounded threads
+_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="datasense-query")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled or has timed out"""
+
+
+class QueryJob:
+    """Handle for a chat query running on the shared worker pool.
+
+    Cancellation stops the job at the next stage boundary, kills a sandbox
+    worker that is running its code, and discards any late result.
+    """
+
+    def __init__(self, user_input, timeout=QUERY_TIMEOUT):
+        self.id = uuid.uuid4().hex
+        self.user_input = user_input
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.stage = "Queued"
+        self.status = "running"  # running, done, cancelled, timed_out
+        self._cancel = threading.Event()
+        self.future = None
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def set_stage(self, stage):
+        """Progress callback for the worker; raises if the job should stop"""
+        if self.is_cancelled():
+            raise JobCancelled(self.status)
+        self.stage = stage
+
+    def is_cancelled(self):
+        """Whether the job should stop.
+
+        Also enforces the wall-clock limit from the worker's side, so a job
+        no session polls any more still stops and frees its thread.
+        """
+        if self.status == "running" and self.elapsed > self.timeout:
+            self.cancel("timed_out")
+        return self._cancel.is_set()
+
+    def cancel(self, status="cancelled"):
+        if self.status == "running":
+            self.status = status
+            self._cancel.set()
+            if self.future is not None:
+                self.future.cancel()  # only succeeds if it never started
+
+    def poll(self):
+        """Update and return status, enforcing the wall-clock limit"""
+        if self.status == "running":
+            if self.future.done():
+                self.status = "done"
+            elif self.elapsed > self.timeout:
+                self.cancel("timed_out")
+        return self.status
+
+    def result(self):
+        """Response dict of a finished job, or an error response for stopped jobs"""
+        status = self.poll()
+        if status == "cancelled":
+            return {"type": "error", "content": "Query cancelled"}
+        if status == "timed_out":
+            return {"type": "error", "content": f"Query timed out after {self.timeout}s"}
+        try:
+            return self.future.result()
+        except JobCancelled:
+            return {"type": "error", "content": "Query cancelled"}
+        except Exception as e:
+            return {"type": "error", "content": f"Error: {str(e)}"}
+
+
+def submit_query(processor, user_input, df, schema, current_model, tables=None, prev=None):
+    """Run QueryProcessor.process_query on the worker pool and return its QueryJob"""
+    job = QueryJob(user_input)
+    job.future = _executor.submit(
+        processor.process_query, user_input, df, schema, current_model,
+        on_stage=job.set_stage, cancelled=job.is_cancelled, tables=tables, prev=prev
+    )
+    return job
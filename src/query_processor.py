@@ -1,82 +1,185 @@
 import ast
-import sqlite3
+import importlib.util
+import re
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-import streamlit as st
+from config import (
+    RESULT_CACHE_MAX_MB, SANDBOX_ENABLED, QUERY_TIMEOUT, COMPILED_CACHE_SIZE, FASTPATH_MIN_ROWS,
+    RESULT_MAX_ROWS, RESULT_MAX_MB,
+)
 from gemini_api import call_gemini_auto
+from query_jobs import JobCancelled
+from result_cache import ResultCache
+from result_limits import grows_rows, limit_result, probe_growth, truncation_note, truncation_summary
+from prompt_builder import build_static_prefix, build_question_prompt
+from insights import generate_insights_stream
+from sandbox import sandbox_pool, SandboxError
+from sql_engine import SqlEngine
+from tracing import span, trace
+from expr_optimizer import optimize_expression, numexpr_plan, HELPERS as OPTIMIZER_HELPERS
+
+# numexpr is imported on first use of the fast path
+NUMEXPR_AVAILABLE = importlib.util.find_spec("numexpr") is not None
+
+# Shared across sessions; keys include the dataset version so reloads never hit stale results
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# SQL without the sandbox: each dataset is loaded into SQLite once, not per query
+sql_engine = SqlEngine()
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_expression(expr, tables=frozenset()):
+    """Parse, optimize, validate and compile a pandas expression.
+
+    tables are the names of other workspace datasets the expression may use.
+    Cached by expression text, so repeated expressions (e.g. df.head(10)) skip
+    parsing and validation; invalid expressions raise and are not cached.
+    """
+    ALLOWED_NAMES = {"df", "pd", "np"} | set(OPTIMIZER_HELPERS) | tables
+    
+    tree = ast.parse(expr, mode="eval")
+    # Validate after optimizing: rewrites may remove lambda arguments and add helpers
+    tree, _ = optimize_expression(tree)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id not in ALLOWED_NAMES:
+            raise ValueError(f"Unauthorized name: {node.id}")
+    return compile(tree, "<safe>", "eval")
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def fast_path_plan(expr):
+    """numexpr plan for a filter/arithmetic expression, or None (cached by text)"""
+    if not NUMEXPR_AVAILABLE:
+        return None
+    tree, _ = optimize_expression(ast.parse(expr, mode="eval"))
+    return numexpr_plan(tree)
+
+def referenced_tables(code, tables):
+    """The datasets in tables that code names; the rest stay out of its cache key and the sandbox"""
+    if not tables:
+        return tables
+    return {name: t for name, t in tables.items() if re.search(rf"\b{re.escape(name)}\b", code, re.IGNORECASE)}
 
 class QueryProcessor:
     """Process natural language queries and execute them on data"""
     
     @staticmethod
-    def safe_eval(expr, df):
-        """Safely evaluate pandas expressions"""
-        ALLOWED_NAMES = {"df", "pd", "np"}
-        
+    def safe_eval(expr, df, tables=None):
+        """Safely evaluate pandas expressions, rewritten into cheaper equivalents first.
+
+        tables ({name: df}) are other workspace datasets the expression can join with.
+        Results are cut to the result budget; an expression that would multiply
+        rows far past it (e.g. a cross join) is only run on a probe of the data.
+        """
+        tables = tables or {}
         try:
-            tree = ast.parse(expr, mode="eval")
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Name) and node.id not in ALLOWED_NAMES:
-                    raise ValueError(f"Unauthorized name: {node.id}")
+            code = compile_expression(expr, frozenset(tables))
+
+            def evaluate(df, tables):
+                return eval(
+                    code,
+                    {"__builtins__": {}},
+                    {**tables, "df": df, "pd": pd, "np": np, **OPTIMIZER_HELPERS}
+                )
+            
+            # Large numeric filters/arithmetic: one fused numexpr pass instead of a temporary per op
+            plan = fast_path_plan(expr) if len(df) >= FASTPATH_MIN_ROWS else None
+            if plan is not None:
+                result = QueryProcessor._eval_numexpr(plan, df)
+                if result is not None:
+                    return limit_result(result)
             
-            return eval(
-                compile(tree, "<safe>", "eval"),
-                {"__builtins__": {}},
-                {"df": df, "pd": pd, "np": np}
-            )
+            if grows_rows(expr):
+                probe = probe_growth(evaluate, df, tables)
+                if probe is not None:
+                    return probe
+            return limit_result(evaluate(df, tables))
+        except MemoryError:
+            raise
         except Exception as e:
             raise ValueError(f"Evaluation error: {str(e)}")
     
-    def process_query(self, user_input, df, schema, current_model):
-        """Process user query and return response"""
+    @staticmethod
+    def _eval_numexpr(plan, df):
+        """Evaluate a fast-path plan, or None when its columns aren't plain int64/float64"""
+        kind, text, columns = plan
+        if any(c not in df.columns or not isinstance(df[c], pd.Series)
+               or df[c].dtype not in (np.int64, np.float64) for c in columns):
+            return None
+        try:
+            import numexpr
+            values = numexpr.evaluate(text, local_dict={f"_c{i}": df[c].to_numpy() for i, c in enumerate(columns)})
+        except Exception:
+            return None  # e.g. integers to negative powers; plain evaluation reports the error
+        if kind == "filter":
+            return df[values]
+        # pandas keeps the column name when every operand is the same column
+        return pd.Series(values, index=df.index, name=columns[0] if len(columns) == 1 else None)
+    
+    @staticmethod
+    def compile_cache_stats():
+        """Hit/miss counts of the compiled-expression cache, including sandbox workers"""
+        info = compile_expression.cache_info()
+        stats = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+        if SANDBOX_ENABLED:
+            for key, value in sandbox_pool.compile_cache_stats().items():
+                stats[key] += value
+        return stats
+    
+    @staticmethod
+    def run_sql(query, df, tables=None):
+        """Run a SQL query against the DataFrame as table 'data' and other datasets by name"""
+        return sql_engine.query(query, {**(tables or {}), "data": df}, max_rows=RESULT_MAX_ROWS, max_mb=RESULT_MAX_MB)
+    
+    @staticmethod
+    def execute(kind, code, df, cancelled=None, tables=None):
+        """Run generated pandas or SQL code, isolated in the sandbox pool when enabled"""
+        if SANDBOX_ENABLED:
+            try:
+                return sandbox_pool.run(kind, code, df, timeout=QUERY_TIMEOUT, cancelled=cancelled, tables=tables)
+            except SandboxError as e:
+                raise ValueError(str(e))
+        if kind == "pandas":
+            with span("pandas.eval"):
+                return QueryProcessor.safe_eval(code, df, tables)
+        return QueryProcessor.run_sql(code, df, tables)
+    
+    def process_query(self, user_input, df, schema, current_model, on_stage=None, cancelled=None, tables=None,
+                      prev=None):
+        """Process user query and return response.
+
+        The model that answered is returned under "model" and the per-stage
+        (stage, seconds, depth) breakdown under "timings". on_stage is called
+        with a short status at each stage and may raise to abort the query;
+        cancelled is polled while generated code runs so it can be killed.
+        tables ({name: df}) are other workspace datasets the code may join with.
+        prev is the (question, result) of the previous answer; follow-ups can
+        query that much smaller result as `prev` instead of df.
+        """
         if df is None:
             return {"type": "text", "content": "Please load data first."}
+        on_stage = on_stage or (lambda stage: None)
         
-        sample_data = df.head(3).to_string()
-        
-        system_prompt = f"""You are a data analysis assistant. Analyze the user's query and respond using EXACTLY one of these XML formats:
-
-1) <chat>...</chat> - For general questions, explanations, or when you need clarification
-2) <pandas>...</pandas> - For pandas operations that return DataFrames or values
-3) <sql>...</sql> - For SQL queries (table name is 'data')
-
-IMPORTANT RULES:
-- Always wrap your code in the appropriate XML tags
-- For pandas: write valid Python pandas code that works with variable 'df'
-- For SQL: write valid SQL for a table named 'data'
-- Add <explain>...</explain> after pandas/SQL to explain what the code does
-- Keep explanations concise and clear
-
-Dataset Information:
-{schema}
-
-Sample Data:
-{sample_data}
-
-EXAMPLES:
-
-User: "show me the first 10 rows"
-Response: <pandas>df.head(10)</pandas><explain>Displays the first 10 rows of the dataset</explain>
-
-User: "what's the average price?"
-Response: <pandas>df['price'].mean()</pandas><explain>Calculates the mean of the price column</explain>
-
-User: "filter rows where sales > 1000"
-Response: <pandas>df[df['sales'] > 1000]</pandas><explain>Filters the dataset to show only rows where sales exceed 1000</explain>
-
-User: "group by category and sum revenue"
-Response: <pandas>df.groupby('category')['revenue'].sum()</pandas><explain>Groups data by category and sums the revenue for each group</explain>
-
-User: "what columns are available?"
-Response: <chat>The dataset has the following columns: {', '.join(df.columns.tolist()[:5])}...</chat>
-
-Now respond to the user's query."""
-
-        model_used, raw_response = call_gemini_auto(system_prompt, user_input)
-        
-        if model_used:
-            st.session_state.current_model = model_used
-        
+        with trace() as spans, span("query.total"):
+            # Static per-dataset prefix (cacheable) + budgeted per-question context
+            on_stage("Building prompt")
+            with span("query.build_prompt"):
+                system_prompt = build_static_prefix(df, schema, tables)
+                question_prompt = build_question_prompt(df, user_input, prev=prev)
+
+            on_stage("Waiting for model")
+            with span("query.model"):
+                model_used, raw_response = call_gemini_auto(system_prompt, question_prompt, cache_system_prompt=True)
+            
+            if prev is not None:
+                tables = {**(tables or {}), "prev": prev[1]}
+            response = self._execute_response(raw_response, df, on_stage, cancelled, tables)
+        response["model"] = model_used or current_model
+        response["timings"] = spans
+        return response
+    
+    def _execute_response(self, raw_response, df, on_stage, cancelled=None, tables=None):
+        """Parse the model's XML-tagged response and run any pandas/SQL it contains"""
         try:
             # Chat response
             if "<chat>" in raw_response and "</chat>" in raw_response:
@@ -90,12 +193,20 @@ Now respond to the user's query."""
                 if "<explain>" in raw_response and "</explain>" in raw_response:
                     explain = raw_response.split("<explain>")[1].split("</explain>")[0].strip()
                 
-                result = self.safe_eval(expr, df)
+                tables = referenced_tables(expr, tables)
+                on_stage("Running pandas")
+                with span("query.execute", kind="pandas"):
+                    result = result_cache.get_or_compute(
+                        ResultCache.make_key(df, "pandas", expr, tables),
+                        lambda: self.execute("pandas", expr, df, cancelled, tables)
+                    )
                 
                 if isinstance(result, pd.DataFrame):
-                    return {"type": "dataframe", "content": result, "explain": explain, "code": expr}
+                    return {"type": "dataframe", "content": result, "explain": explain, "code": expr,
+                            "note": truncation_note(result), "summary": truncation_summary(result)}
                 elif isinstance(result, pd.Series):
-                    return {"type": "dataframe", "content": result.to_frame(), "explain": explain, "code": expr}
+                    return {"type": "dataframe", "content": result.to_frame(), "explain": explain, "code": expr,
+                            "note": truncation_note(result), "summary": truncation_summary(result)}
                 else:
                     return {"type": "text", "content": f"Result: {str(result)}\n\n{explain}" if explain else f"Result: {str(result)}"}
             
@@ -106,37 +217,29 @@ Now respond to the user's query."""
                 if "<explain>" in raw_response and "</explain>" in raw_response:
                     explain = raw_response.split("<explain>")[1].split("</explain>")[0].strip()
                 
-                conn = sqlite3.connect(":memory:")
-                df.to_sql("data", conn, index=False, if_exists="replace")
-                result = pd.read_sql_query(query, conn)
-                conn.close()
+                tables = referenced_tables(query, tables)
+                on_stage("Running SQL")
+                with span("query.execute", kind="sql"):
+                    result = result_cache.get_or_compute(
+                        ResultCache.make_key(df, "sql", query, tables),
+                        lambda: self.execute("sql", query, df, cancelled, tables)
+                    )
                 
-                return {"type": "dataframe", "content": result, "explain": explain, "code": query}
+                return {"type": "dataframe", "content": result, "explain": explain, "code": query,
+                        "note": truncation_note(result), "summary": truncation_summary(result)}
             
             else:
                 return {"type": "text", "content": raw_response}
         
+        except JobCancelled:
+            raise  # from on_stage: the job stops here rather than reporting an error
         except Exception as e:
             return {"type": "error", "content": f"Error: {str(e)}"}
     
     def generate_insights(self, df, schema):
         """Generate AI insights about the dataset"""
-        insights_prompt = f"""Analyze this dataset and provide 5-7 key insights in bullet points.
-
-Dataset Info:
-{schema}
-
-Summary Statistics:
-{df.describe().to_string()}
-
-Provide insights about:
-- Data quality and completeness
-- Key patterns or trends
-- Interesting findings
-- Potential issues or outliers
-- Recommendations for further analysis
-
-Keep each insight concise (1-2 sentences)."""
-        
-        _, response = call_gemini_auto("You are a data analyst providing insights.", insights_prompt)
-        return response
\ No newline at end of file
+        return "\n\n".join(f"**{title}**\n{text}" for _, title, text in self.generate_insights_stream(df, schema))
+    
+    def generate_insights_stream(self, df, schema):
+        """Yield (facet, title, insights) per analysis facet as each completes"""
+        return generate_insights_stream(df, schema)
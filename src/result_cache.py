@@ -0,0 +1,156 @@
+import ast
+import os
+import re
+import sys
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+_MISSING = object()
+_versions = {}  # id(frame) -> (weak reference to it, its dataset version)
+_SQL_LITERAL = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def assign_version(df, version=None):
+    """Give this frame object a dataset version (a new one unless given); returns it.
+
+    Called where datasets are loaded or registered. The version belongs to
+    the object, not its attrs, which pandas copies to every frame derived
+    from it: a filtered or edited copy must not share the source's cache
+    entries. Editing a frame in place doesn't change its version; assign
+    a new one after doing so.
+    """
+    version = version or uuid.uuid4().hex
+    key = id(df)
+    # No lock: the callback runs from the garbage collector, possibly mid-update
+    _versions[key] = (weakref.ref(df, lambda _: _versions.pop(key, None)), version)
+    return version
+
+
+def dataset_version(df):
+    """Version token keying df's per-dataset caches.
+
+    A frame that was never assigned one (see assign_version) gets a new one
+    here, so every unregistered frame is a dataset of its own.
+    """
+    entry = _versions.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return assign_version(df)
+
+
+def source_stamp(df):
+    """Modification stamp of the SQLite file SQL reads df from in place, or None.
+
+    Covers the write-ahead log too, where writes land until a checkpoint.
+    """
+    source = df.attrs.get("sqlite_source")
+    if not source:
+        return None
+    stamp = []
+    for path in (source[0], source[0] + "-wal"):
+        try:
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def normalize_code(code, target):
+    """Canonical form of generated code so formatting differences share a cache entry"""
+    if target == "pandas":
+        try:
+            return ast.dump(ast.parse(code, mode="eval"))
+        except SyntaxError:
+            return code.strip()
+    # SQL: collapse whitespace and drop trailing semicolons outside string literals
+    parts = _SQL_LITERAL.split(code.strip().rstrip(";"))
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts)).strip()
+
+
+def estimate_size(value):
+    """Approximate in-memory size of a cached result in bytes"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU cache of query results bounded by total size in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(df, target, code, tables=None):
+        key = (dataset_version(df), target, normalize_code(code, target))
+        if tables:
+            # Other workspace datasets the code could join with
+            key += (tuple(sorted((name, dataset_version(t)) for name, t in tables.items())),)
+        if target == "sql":
+            # SQL reads SQLite-sourced datasets from the file, which may have changed since loading
+            stamps = (source_stamp(df),) + tuple(source_stamp(tables[name]) for name in sorted(tables or {}))
+            if any(stamps):
+                key += (stamps,)
+        return key
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return  # Larger than the whole cache; not worth evicting everything
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,123 @@
+import ast
+import math
+from functools import lru_cache
+
+import pandas as pd
+
+from config import RESULT_MAX_ROWS, RESULT_MAX_MB, RESULT_PROBE_ROWS, RESULT_MAX_GROWTH
+from result_cache import estimate_size
+
+# Calls that can return more rows than they are given (joins, cross products, reshapes)
+_GROWING_CALLS = {"merge", "join", "explode", "concat", "melt", "stack", "repeat"}
+_SIZE_SAMPLE_ROWS = 1000
+
+
+def row_budget(sample, max_rows=RESULT_MAX_ROWS, max_mb=RESULT_MAX_MB):
+    """Rows of a result shaped like sample that fit both the row and the byte budget"""
+    rows = min(len(sample), _SIZE_SAMPLE_ROWS)
+    if not rows or not max_mb:
+        return max_rows
+    per_row = estimate_size(sample.head(rows)) / rows
+    return max(1, min(max_rows, int(max_mb * 1024 * 1024 / per_row))) if per_row else max_rows
+
+
+def mark_truncated(result, rows=None, probe=None, summary=None):
+    """Record on a cut-down result how big the full one is (rows None: unknown, more than kept).
+
+    summary holds statistics of every row of the full result, when it was computed.
+    """
+    result.attrs["truncated"] = {"kept": len(result), "rows": rows, "probe": probe, "summary": summary}
+    return result
+
+
+def summarize(result):
+    """Per-column statistics (count, mean, min/max, most frequent value...) of a result, or None"""
+    frame = result.to_frame() if isinstance(result, pd.Series) else result
+    try:
+        return frame.describe(include="all")
+    except Exception:
+        return None  # e.g. unhashable values in a column
+
+
+def limit_result(result):
+    """result cut to the first rows that fit the budget, with a summary of all of them; other values pass through"""
+    if not isinstance(result, (pd.DataFrame, pd.Series)):
+        return result
+    keep = row_budget(result)
+    if len(result) <= keep:
+        return result
+    return mark_truncated(result.head(keep), rows=len(result), summary=summarize(result))
+
+
+@lru_cache(maxsize=512)
+def grows_rows(expr):
+    """Whether a pandas expression calls something that can return more rows than df has"""
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError:
+        return False
+    return any(isinstance(node, ast.Attribute) and node.attr in _GROWING_CALLS for node in ast.walk(tree))
+
+
+def probe_growth(evaluate, df, tables):
+    """Estimate an expression's result size on random samples before running it in full.
+
+    evaluate(df, tables) computes the result. Every dataset over
+    RESULT_PROBE_ROWS rows is sampled down to that many and the expression
+    run on the samples, then once more per sampled dataset with only half of
+    it: how much the result shrinks gives its exponent (1 for a join against
+    a table or an explode, 2 for a self-join or cross product), which scales
+    the sample's result up to the full datasets. Returns the sample's
+    result, marked truncated with the estimated full size, when the result
+    would grow more than RESULT_MAX_GROWTH times df and past the budget;
+    None when the full expression should just run.
+    """
+    datasets = {"df": df, **tables}
+    sampled = [name for name, d in datasets.items() if len(d) > RESULT_PROBE_ROWS]
+    if not sampled:
+        return None
+    samples = {name: d.sample(n=RESULT_PROBE_ROWS, random_state=0) if name in sampled else d
+               for name, d in datasets.items()}
+
+    def run(inputs):
+        inputs = dict(inputs)
+        return evaluate(inputs.pop("df"), inputs)
+
+    try:
+        probe = run(samples)
+        if not isinstance(probe, (pd.DataFrame, pd.Series)) or not len(probe):
+            return None
+        estimated = len(probe)
+        for name in sampled:
+            halved = run(dict(samples, **{name: samples[name].head(RESULT_PROBE_ROWS // 2)}))
+            # Nothing left from half the rows: matches are sparse, as in a self-join on a rare key
+            exponent = min(2.0, max(0.0, math.log2(len(probe) / len(halved)))) if len(halved) else 2.0
+            estimated *= (len(datasets[name]) / RESULT_PROBE_ROWS) ** exponent
+    except Exception:
+        return None  # e.g. positional indexing past the sample; the full run decides
+    estimated = int(estimated)
+    if estimated <= RESULT_MAX_GROWTH * len(df) or estimated <= row_budget(probe):
+        return None
+    return mark_truncated(probe.head(row_budget(probe)), rows=estimated, probe=RESULT_PROBE_ROWS)
+
+
+def truncation_note(result):
+    """What a truncated result leaves out, for display next to it; empty when complete"""
+    info = getattr(result, "attrs", {}).get("truncated")
+    if not info:
+        return ""
+    if info["probe"]:
+        return (f"This would return about {info['rows']:,} rows (estimated from random samples of "
+                f"{info['probe']:,} rows of each dataset), far over the result budget, so it wasn't run in "
+                f"full. Showing the result for those samples only; ask for an aggregate or a top-N instead.")
+    if info["rows"] is None:
+        return (f"Result stopped at {info['kept']:,} rows, the result budget; more rows exist. "
+                f"Ask for an aggregate or a top-N to see all of it.")
+    return (f"Result has {info['rows']:,} rows; showing the first {info['kept']:,} (the result budget) "
+            f"and a summary of all of them. Ask for an aggregate or a top-N to see all of it.")
+
+
+def truncation_summary(result):
+    """Statistics of every row of a truncated result, or None"""
+    info = getattr(result, "attrs", {}).get("truncated")
+    return info.get("summary") if info else None
@@ -0,0 +1,381 @@
+import multiprocessing
+import os
+from collections import Counter
+import queue
+import signal
+import threading
+import time
+
+import pandas as pd
+
+from config import (
+    SANDBOX_WORKERS,
+    SANDBOX_MEMORY_MB,
+    SANDBOX_CPU_SECONDS,
+    SANDBOX_DATA_DIR,
+    SANDBOX_MAX_DATASET_FILES,
+    RESULT_MAX_ROWS,
+    RESULT_MAX_MB,
+)
+from result_cache import assign_version, dataset_version
+from sql_engine import SqlEngine, SqliteTable, sqlite_source
+from tracing import record, span, trace
+
+try:
+    import resource
+except ImportError:  # Windows: no per-process CPU limits
+    resource = None
+
+_POLL_INTERVAL = 0.05
+_WORKER_DATASETS = 4  # frames (and SQL tables) a worker keeps; a job's own datasets are never evicted
+
+
+class SandboxError(Exception):
+    """Raised when a job fails, exceeds its limits, or is cancelled"""
+
+
+# -------------------------
+# Dataset files
+# -------------------------
+_write_lock = threading.Lock()
+_pin_lock = threading.Lock()
+_pinned = Counter()  # dataset file -> jobs using it; pruning skips these
+
+
+def dataset_path(df):
+    """Path of the shared on-disk copy of df, writing it on first use.
+
+    The file is pinned against pruning until release_dataset(path).
+    """
+    version = dataset_version(df)
+    os.makedirs(SANDBOX_DATA_DIR, exist_ok=True)
+    path = _pin_existing(version)
+    if path is not None:
+        return path
+
+    with _write_lock:
+        base = os.path.join(SANDBOX_DATA_DIR, version)
+        try:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df)
+            # Workers must get back exactly these dtypes (e.g. not categoricals, which come
+            # back with other categories); checked on the schema alone, without converting data
+            empty = table.schema.empty_table().to_pandas()
+            if not (empty.dtypes.equals(df.dtypes) and empty.index.dtype == df.index.dtype):
+                raise TypeError("dtypes don't round-trip through Arrow")
+            path = base + ".arrow"
+            with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        except Exception:
+            # No pyarrow, mixed-type object columns Arrow can't represent, or dtypes it changes
+            path = base + ".pkl"
+            df.to_pickle(path + ".tmp")
+        with _pin_lock:
+            os.replace(path + ".tmp", path)
+            _pinned[path] += 1
+        _prune_dataset_files()
+    return path
+
+
+def release_dataset(path):
+    """Unpin a dataset file returned by dataset_path"""
+    with _pin_lock:
+        _pinned[path] -= 1
+        if _pinned[path] <= 0:
+            del _pinned[path]
+
+
+def _pin_existing(version):
+    with _pin_lock:
+        for ext in (".arrow", ".pkl"):
+            path = os.path.join(SANDBOX_DATA_DIR, version + ext)
+            if os.path.exists(path):
+                os.utime(path)
+                _pinned[path] += 1
+                return path
+    return None
+
+
+def _prune_dataset_files():
+    """Remove the least recently used dataset files past SANDBOX_MAX_DATASET_FILES, except pinned ones"""
+    def mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+
+    with _pin_lock:
+        files = [os.path.join(SANDBOX_DATA_DIR, f) for f in os.listdir(SANDBOX_DATA_DIR)
+                 if f.endswith((".arrow", ".pkl"))]
+        files.sort(key=mtime, reverse=True)
+        for path in files[SANDBOX_MAX_DATASET_FILES:]:
+            if path in _pinned:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _job_dataset(kind, df):
+    """What a worker gets for df: for SQL its SQLite source table (read in place), else its (pinned) dataset file"""
+    if kind == "sql":
+        source = sqlite_source(df)
+        if source is not None and os.path.exists(source.path):
+            return source
+    return dataset_path(df)
+
+
+def _read_dataset(path):
+    if path.endswith(".arrow"):
+        import pyarrow as pa
+        # The same dtypes as the parent's frame, so generated code behaves as in-process.
+        # Unconsolidated blocks let null-free numeric and datetime columns stay views of the
+        # memory map (no private copy; workers on the same dataset share its pages)
+        df = pa.ipc.open_file(pa.memory_map(path, "r")).read_all().to_pandas(split_blocks=True)
+    else:
+        df = pd.read_pickle(path)
+    # Same version as in the parent, so the worker's SQL engine keys tables by it
+    assign_version(df, os.path.splitext(os.path.basename(path))[0])
+    return df
+
+
+# -------------------------
+# Worker process
+# -------------------------
+def _data_size():
+    """Bytes of the worker's heap and anonymous maps (VmData), or None off Linux"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmData:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _limit_memory(memory_mb):
+    """Let the next job allocate at most memory_mb more heap (RLIMIT_DATA).
+
+    An allocation past it fails with MemoryError straight away, before the
+    parent's RSS polling could notice. The limit is relative to the current
+    VmData, which includes address space reserved by allocator arenas and
+    thread pools but never touched; the memory-mapped datasets are file
+    backed and don't count (unlike with RLIMIT_AS).
+    """
+    if resource is None or not memory_mb or not hasattr(resource, "RLIMIT_DATA"):
+        return
+    used = _data_size()
+    if used is None:
+        return
+    limit = used + memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    if hard == resource.RLIM_INFINITY or limit <= hard:
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+
+
+def _worker_main(conn, memory_mb=None):
+    """Worker loop: receive jobs, evaluate them, send back results"""
+    # Imported here so the parent doesn't need the processor loaded to spawn workers
+    from query_processor import QueryProcessor, compile_expression
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    datasets = {}  # path -> df, most recent last
+    # Each dataset is loaded into SQLite once, then reused by every query and join
+    sql_engine = SqlEngine(max_tables=_WORKER_DATASETS)
+
+    def load(path, needed):
+        if isinstance(path, SqliteTable):
+            return path  # the SQL engine reads it from the file
+        if path in datasets:
+            datasets[path] = datasets.pop(path)
+        else:
+            for old in [p for p in datasets if p not in needed][:max(0, len(datasets) + 1 - _WORKER_DATASETS)]:
+                del datasets[old]
+            with span("sandbox.load_dataset"):
+                datasets[path] = _read_dataset(path)
+        return datasets[path]
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        kind, code, path, table_paths, cpu_seconds = job
+        # Spans are reported back so the parent can trace them
+        with trace(export=False) as spans:
+            try:
+                needed = {path, *table_paths.values()}
+                df = load(path, needed)
+                tables = {name: load(table_path, needed) for name, table_path in table_paths.items()}
+
+                if resource is not None and cpu_seconds:
+                    used = resource.getrusage(resource.RUSAGE_SELF)
+                    limit = int(used.ru_utime + used.ru_stime) + cpu_seconds
+                    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+                    if hard == resource.RLIM_INFINITY or limit <= hard:
+                        resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+                _limit_memory(memory_mb)
+
+                if kind == "pandas":
+                    with span("pandas.eval"):
+                        result = QueryProcessor.safe_eval(code, df, tables)
+                else:
+                    result = sql_engine.query(code, {**tables, "data": df},
+                                              max_rows=RESULT_MAX_ROWS, max_mb=RESULT_MAX_MB)
+                reply = ("ok", result)
+            except MemoryError:
+                reply = ("error", "Query ran out of memory")
+            except Exception as e:
+                reply = ("error", str(e))
+        info = compile_expression.cache_info()
+        timings = [(stage, seconds) for stage, seconds, _ in spans]
+        conn.send(reply + ({"hits": info.hits, "misses": info.misses, "size": info.currsize, "timings": timings},))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_mb=None):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def rss_mb(self):
+        """Resident set size from /proc (Linux); None where unavailable"""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """Fixed-size pool of worker processes that evaluate model-generated code.
+
+    Each job gets a CPU-time limit (RLIMIT_CPU) and a heap-growth limit of
+    memory_mb (RLIMIT_DATA), and as a backstop the parent kills a worker
+    whose RSS exceeds memory_mb, so a runaway expression fails alone
+    instead of pinning or OOM-killing the Streamlit server. Datasets are
+    written once per version to an Arrow file that workers memory-map
+    (zero-copy where the column allows), so jobs never pickle the dataset
+    and workers on the same dataset share its pages; SQL on datasets from a
+    SQLite file reads the file itself.
+    """
+
+    def __init__(self, size=SANDBOX_WORKERS, memory_mb=SANDBOX_MEMORY_MB, cpu_seconds=SANDBOX_CPU_SECONDS):
+        self.size = size
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._worker_stats = {}  # pid -> last compiled-expression cache stats of a live worker
+
+    def _checkout(self, timeout):
+        with self._lock:
+            if self._idle.empty() and self._started < self.size:
+                self._started += 1
+                return _Worker(self._ctx, self.memory_mb)
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise SandboxError("All sandbox workers are busy")
+        if not worker.alive():
+            self._worker_stats.pop(worker.process.pid, None)
+            worker = _Worker(self._ctx, self.memory_mb)
+        return worker
+
+    def _replace(self, worker):
+        worker.kill()
+        self._worker_stats.pop(worker.process.pid, None)
+        self._idle.put(_Worker(self._ctx, self.memory_mb))
+
+    def run(self, kind, code, df, timeout=None, cancelled=None, tables=None):
+        """Evaluate pandas or SQL code against df (and other datasets by name) in a worker process.
+
+        Blocks until the result arrives; raises SandboxError when the job
+        fails, exceeds its CPU/memory limits, times out, or is cancelled.
+        A worker that is killed is replaced so only this job fails.
+        """
+        datasets = []  # pinned against pruning until the job is done
+        try:
+            with span("sandbox.dataset_file"):
+                path = _job_dataset(kind, df)
+                datasets.append(path)
+                table_paths = {}
+                for name, t in (tables or {}).items():
+                    table_paths[name] = _job_dataset(kind, t)
+                    datasets.append(table_paths[name])
+            return self._run((kind, code, path, table_paths, self.cpu_seconds), timeout, cancelled)
+        finally:
+            for dataset in datasets:
+                if not isinstance(dataset, SqliteTable):
+                    release_dataset(dataset)
+
+    def _run(self, job, timeout, cancelled):
+        deadline = time.monotonic() + timeout if timeout else None
+        with span("sandbox.checkout"):
+            worker = self._checkout(timeout or 30)
+        try:
+            worker.conn.send(job)
+            # Includes a new worker's interpreter start-up and imports
+            with span("sandbox.wait"):
+                while not worker.conn.poll(_POLL_INTERVAL):
+                    if not worker.alive():
+                        raise EOFError
+                    rss = worker.rss_mb()
+                    if rss is not None and rss > self.memory_mb:
+                        self._replace(worker)
+                        raise SandboxError(f"Query exceeded the {self.memory_mb} MB memory limit")
+                    if cancelled is not None and cancelled():
+                        self._replace(worker)
+                        raise SandboxError("Query cancelled")
+                    if deadline is not None and time.monotonic() > deadline:
+                        self._replace(worker)
+                        raise SandboxError("Query timed out")
+                status, payload, stats = worker.conn.recv()
+                for stage, seconds in stats.pop("timings", []):
+                    record(stage, seconds, where="sandbox")
+            self._worker_stats[worker.process.pid] = stats
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            exitcode = worker.process.exitcode
+            self._replace(worker)
+            if exitcode == -getattr(signal, "SIGXCPU", 0):
+                raise SandboxError(f"Query exceeded the {self.cpu_seconds}s CPU limit")
+            raise SandboxError("Sandbox worker crashed")
+        except SandboxError:
+            raise  # the worker was already replaced
+        except BaseException:
+            # e.g. a job that can't be pickled or a reply that can't be unpickled; the worker's
+            # pipe is in an unknown state, and leaking it would shrink the pool for good
+            self._replace(worker)
+            raise
+        self._idle.put(worker)
+
+        if status == "error":
+            raise SandboxError(payload)
+        return payload
+
+    def compile_cache_stats(self):
+        """Compiled-expression cache counters summed over the live workers"""
+        totals = {"hits": 0, "misses": 0, "size": 0}
+        for stats in list(self._worker_stats.values()):
+            totals["hits"] += stats["hits"]
+            totals["misses"] += stats["misses"]
+            totals["size"] += stats["size"]
+        return totals
+
+
+sandbox_pool = SandboxPool()
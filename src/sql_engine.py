@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import quote
+
+import pandas as pd
+
+from config import SQL_ENGINE_MAX_TABLES, SQLITE_MMAP_MB
+from result_cache import dataset_version
+from result_limits import mark_truncated, row_budget
+from tracing import span
+
+# Generated SQL may only read; the shared tables must survive every query
+_READ_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    getattr(sqlite3, "SQLITE_RECURSIVE", 33),  # WITH RECURSIVE; constant added in Python 3.11
+}
+
+
+_MAX_ATTACHED = 8  # SQLite allows 10 attached databases per connection
+_FETCH_ROWS = 10_000
+
+# A table in a SQLite file, queried where it is instead of copied in
+SqliteTable = namedtuple("SqliteTable", "path table")
+
+
+def _read_only(action, *args):
+    return sqlite3.SQLITE_OK if action in _READ_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def sqlite_source(df):
+    """The SqliteTable df was loaded from (stamped by DataHandler.load_table), or None"""
+    source = df.attrs.get("sqlite_source")
+    return SqliteTable(*source) if source else None
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class SqlEngine:
+    """One in-memory SQLite database that every SQL query runs in.
+
+    Each DataFrame is copied in once per dataset version (as a table named
+    after the version) and kept, least recently used first out, up to
+    max_tables; a query sees the frames it was given under its own names
+    through temporary views, so repeated questions and joins across several
+    datasets never re-ingest them. Datasets loaded from a SQLite file aren't
+    copied at all: the file is attached read-only (memory-mapped up to
+    SQLITE_MMAP_MB) and the view reads the source table in place.
+    """
+
+    def __init__(self, max_tables=SQL_ENGINE_MAX_TABLES):
+        self.max_tables = max_tables
+        self._conn = None
+        self._tables = OrderedDict()  # dataset version -> table name, most recent last
+        self._attached = OrderedDict()  # SQLite file path -> schema name, most recent last
+        self._next_schema = 0
+        self._views = []
+        self._lock = threading.Lock()
+
+    def _ingest(self, df, keep):
+        version = dataset_version(df)
+        if version in self._tables:
+            self._tables.move_to_end(version)
+            return self._tables[version]
+
+        table = f"dataset_{version}"
+        with span("sql.ingest"):
+            df.to_sql(table, self._conn, index=False)
+        self._tables[version] = table
+        # Evict the oldest tables this query doesn't use
+        for old in [v for v in self._tables if v not in keep][:max(0, len(self._tables) - self.max_tables)]:
+            self._conn.execute(f'DROP TABLE "{self._tables.pop(old)}"')
+        return f'main."{table}"'
+
+    def _attach(self, source, keep):
+        """Qualified name of source's table in its read-only attached file; raises sqlite3.Error"""
+        path = os.path.abspath(source.path)
+        schema = self._attached.get(path)
+        if schema is None:
+            for old in [p for p in self._attached if p not in keep][:max(0, len(self._attached) + 1 - _MAX_ATTACHED)]:
+                self._conn.execute(f"DETACH DATABASE {self._attached.pop(old)}")
+            schema = f"src_{self._next_schema}"
+            self._conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{quote(path)}?mode=ro",))
+            self._next_schema += 1
+            self._attached[path] = schema
+            if SQLITE_MMAP_MB:
+                self._conn.execute(f"PRAGMA {schema}.mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}")
+        self._attached.move_to_end(path)
+        qualified = f"{schema}.{_quote(source.table)}"
+        self._conn.execute(f"SELECT 1 FROM {qualified} LIMIT 0")  # the table may have been dropped
+        return qualified
+
+    def query(self, sql, tables, max_rows=None, max_mb=None):
+        """Run sql with each dataset in tables visible as a table of that name.
+
+        tables maps names to DataFrames or SqliteTables; a frame loaded from a
+        SQLite file is read from the file when it can still be opened. With
+        max_rows (and max_mb), fetching stops once the result outgrows them and
+        the rows so far are returned, marked truncated.
+        """
+        with self._lock:
+            if self._conn is None:
+                # Queries from any query thread; the lock serializes them.
+                # uri=True lets ATTACH open files read-only with file:...?mode=ro
+                self._conn = sqlite3.connect(":memory:", check_same_thread=False, uri=True)
+            for view in self._views:
+                self._conn.execute(f'DROP VIEW IF EXISTS temp."{view}"')
+            self._views = []
+
+            sources = {name: t if isinstance(t, SqliteTable) else sqlite_source(t) for name, t in tables.items()}
+            keep = {dataset_version(t) for t in tables.values() if isinstance(t, pd.DataFrame)}
+            keep_files = {os.path.abspath(s.path) for s in sources.values() if s}
+            for name, t in tables.items():
+                table = None
+                if sources[name]:
+                    try:
+                        table = self._attach(sources[name], keep_files)
+                    except sqlite3.Error:
+                        if not isinstance(t, pd.DataFrame):
+                            raise ValueError(f"Cannot read table {sources[name].table} from {sources[name].path}")
+                if table is None:
+                    table = self._ingest(t, keep)
+                self._conn.execute(f'CREATE TEMP VIEW "{name}" AS SELECT * FROM {table}')
+                self._views.append(name)
+
+            self._conn.set_authorizer(_read_only)
+            try:
+                with span("sql.query"):
+                    return self._fetch(sql, max_rows, max_mb)
+            finally:
+                self._conn.set_authorizer(None)
+
+    def _fetch(self, sql, max_rows, max_mb):
+        cursor = self._conn.execute(sql)
+        try:
+            columns = [d[0] for d in cursor.description or ()]
+            rows, limit, truncated = [], max_rows, False
+            while True:
+                batch = cursor.fetchmany(_FETCH_ROWS)
+                if not batch:
+                    break
+                if limit is not None and not rows:
+                    # Byte budget from the first rows' size
+                    limit = row_budget(pd.DataFrame.from_records(batch, columns=columns), max_rows, max_mb)
+                rows.extend(batch)
+                if limit is not None and len(rows) > limit:
+                    del rows[limit:]
+                    truncated = True
+                    break
+        finally:
+            cursor.close()
+        result = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        return mark_truncated(result) if truncated else result
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._tables.clear()
+            self._attached.clear()
+            self._views = []
@@ -0,0 +1,169 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from config import METRICS_BUCKETS, METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL
+
+# Spans of the trace running in this thread/context (None outside a trace) and the nesting depth
+_current_trace = contextvars.ContextVar("datasense_trace", default=None)
+_depth = contextvars.ContextVar("datasense_span_depth", default=0)
+
+# (stage, labels) -> [bucket counts..., +Inf count, sum]
+_histograms = {}
+_lock = threading.Lock()
+_last_export = 0.0
+_server = None
+
+
+def _observe(stage, labels, seconds):
+    key = (stage, tuple(sorted(labels.items())))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(METRICS_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(METRICS_BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += 1
+        hist[-1] += seconds
+
+
+def _span_name(stage, labels):
+    return stage + "".join(f" [{v}]" for _, v in sorted(labels.items()))
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time a stage into its latency histogram and the current trace (if any)"""
+    spans = _current_trace.get()
+    depth = _depth.get()
+    if spans is not None:
+        index = len(spans)
+        spans.append(None)  # keep start order; filled in when the stage ends
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _depth.reset(token)
+        _observe(stage, labels, seconds)
+        if spans is not None:
+            spans[index] = (_span_name(stage, labels), seconds, depth)
+
+
+def record(stage, seconds, **labels):
+    """Add a stage timed elsewhere (e.g. in a sandbox worker) as a child of the current span"""
+    _observe(stage, labels, seconds)
+    spans = _current_trace.get()
+    if spans is not None:
+        spans.append((_span_name(stage, labels), seconds, _depth.get()))
+
+
+def traced(stage):
+    """Decorator form of span() for a whole function"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace(export=True):
+    """Collect the spans recorded in this context.
+
+    Yields a list that fills with (stage, seconds, depth) in start order; a
+    stage's time includes its children (the following entries one level deeper).
+    export=False leaves METRICS_FILE alone (sandbox workers report to the parent).
+    """
+    spans = []
+    token = _current_trace.set(spans)
+    depth_token = _depth.set(0)
+    try:
+        yield spans
+    finally:
+        _depth.reset(depth_token)
+        _current_trace.reset(token)
+        if export:
+            _export_file()
+
+
+def render_prometheus():
+    """All stage histograms in the Prometheus text exposition format"""
+    with _lock:
+        items = sorted((key, list(hist)) for key, hist in _histograms.items())
+    lines = [
+        "# HELP datasense_stage_duration_seconds Time spent in each processing stage",
+        "# TYPE datasense_stage_duration_seconds histogram",
+    ]
+    for (stage, labels), hist in items:
+        label_text = "".join(f',{k}="{_escape(v)}"' for k, v in labels)
+        base = f'stage="{_escape(stage)}"{label_text}'
+        for bound, count in zip(METRICS_BUCKETS, hist):
+            lines.append(f'datasense_stage_duration_seconds_bucket{{{base},le="{bound}"}} {count}')
+        lines.append(f'datasense_stage_duration_seconds_bucket{{{base},le="+Inf"}} {hist[-2]}')
+        lines.append(f"datasense_stage_duration_seconds_sum{{{base}}} {hist[-1]:.6f}")
+        lines.append(f"datasense_stage_duration_seconds_count{{{base}}} {hist[-2]}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _export_file():
+    """Rewrite METRICS_FILE after a trace, at most once per METRICS_FILE_INTERVAL"""
+    global _last_export
+    if not METRICS_FILE:
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _last_export < METRICS_FILE_INTERVAL:
+            return
+        _last_export = now
+    try:
+        tmp = METRICS_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(render_prometheus())
+        os.replace(tmp, METRICS_FILE)
+    except OSError:
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics on port once per process; no-op when port is 0 or already served"""
+    global _server
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            data = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+            except OSError:
+                _server = False  # port taken, e.g. by another app process; don't retry every rerun
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True, name="datasense-metrics").start()
+    return _server or None
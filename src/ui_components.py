@@ -157,8 +157,8 @@ def render_data_source_selector():
     return source_type
 
 def render_csv_uploader():
-    """Render CSV file uploader"""
-    return st.sidebar.file_uploader("Upload CSV", type=["csv"])
+    """Render CSV file uploader; each file is added to the workspace"""
+    return st.sidebar.file_uploader("Upload CSV", type=["csv"], accept_multiple_files=True)
 
 def render_database_form():
     """Render database connection form"""
@@ -217,28 +217,75 @@ def render_database_form():
         
         return db_type, connection_params, test_btn, connect_btn
 
-def render_table_selector(tables, db_type):
+def render_table_selector(tables, db_type, catalog=None):
     """Render table selector for database connections"""
     if not tables:
         st.sidebar.warning("No tables/collections found in database")
         return None
     
+    catalog = catalog or {}
+    
+    def describe(name):
+        info = catalog.get(name, {})
+        parts = []
+        if info.get("row_estimate") is not None:
+            parts.append(f"~{info['row_estimate']:,} rows")
+        if info.get("columns"):
+            parts.append(f"{len(info['columns'])} cols")
+        return f"{name} ({', '.join(parts)})" if parts else name
+    
     with st.sidebar.expander("Select Table/Collection", expanded=True):
         label = "Available Collections" if db_type == "MongoDB" else \
                 "Available Keys" if db_type == "Redis" else \
                 "Available Tables"
         
-        selected_table = st.selectbox(label, tables)
+        selected_table = st.selectbox(label, tables, format_func=describe)
+        info = catalog.get(selected_table, {})
+        row_estimate = info.get("row_estimate")
+        
+        if info.get("columns"):
+            st.caption(", ".join(f"{name}: {dtype}" for name, dtype in info["columns"][:20]))
         
-        # For Redis and large datasets, add limit option
+        # Default row limit follows the memory budget; NoSQL scans stay smaller
+        from data_handler import DataHandler
+        from config import LOAD_MIN_ROWS, LOAD_MAX_ROWS
+        default_limit = DataHandler.rows_for_budget(info)
         if db_type in ["Redis", "MongoDB", "Cassandra"]:
-            limit = st.number_input("Max rows to load", value=1000, min_value=100, max_value=50000, step=100)
-        else:
-            limit = 10000
+            default_limit = min(default_limit, 1000 if row_estimate is None else max(100, min(1000, row_estimate)))
+        elif row_estimate is not None:
+            default_limit = max(LOAD_MIN_ROWS, min(default_limit, row_estimate))
+        limit = st.number_input("Max rows to load", value=default_limit, min_value=100,
+                                max_value=LOAD_MAX_ROWS, step=100)
+        
+        # Redis keys come back in SCAN order, which isn't a random sample
+        modes = ["First rows"]
+        if db_type != "Redis":
+            modes.append("Random sample")
+        if db_type not in ["Redis", "Cassandra"]:
+            modes.append("Newest rows")
+        load_mode = st.radio("Load mode", modes, horizontal=True,
+                             help="Random sample uses the database's native sampling so charts and AI answers aren't biased toward the oldest rows. "
+                                  "Newest rows loads the latest rows by an increasing column (e.g. an id) and can later fetch only rows added since")
+        stratify_by = None
+        if load_mode == "Random sample" and info.get("columns"):
+            choice = st.selectbox("Stratify by (optional)", ["(none)"] + [name for name, _ in info["columns"]])
+            stratify_by = None if choice == "(none)" else choice
+        watermark = None
+        if load_mode == "Newest rows":
+            if info.get("columns"):
+                watermark = st.selectbox("Increasing column", [name for name, _ in info["columns"]])
+            else:
+                watermark = st.text_input("Increasing column", value="_id" if db_type == "MongoDB" else "id")
+        
+        if row_estimate is not None and row_estimate > limit:
+            verb = "sampled" if load_mode == "Random sample" else "loaded"
+            st.warning(f"Table has ~{row_estimate:,} rows; only {limit:,} will be {verb}")
         
         load_table_btn = st.button("Load Data", use_container_width=True, type="primary")
         
-        return (selected_table, limit) if load_table_btn else (None, limit)
+        load_options = {"sample": load_mode == "Random sample", "stratify_by": stratify_by, "row_estimate": row_estimate,
+                        "watermark": watermark, "budget_rows": DataHandler.rows_for_budget(info)}
+        return (selected_table, int(limit), load_options) if load_table_btn else (None, int(limit), load_options)
 
 def render_data_source_info(source_type, table_name=None, connection_info=None):
     """Render current data source information"""
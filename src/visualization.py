@@ -1,7 +1,8 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import streamlit as st
+from tracing import span, traced
+
+# matplotlib and seaborn are imported on first draw so they don't delay the first page paint
 
 class Visualizer:
     """Handle all visualization and chart generation"""
@@ -13,6 +14,7 @@ class Visualizer:
     
     def _setup_dark_plot(self, figsize=(10, 6)):
         """Setup plot with dark theme"""
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(figsize=figsize)
         fig.patch.set_facecolor('#2d2d2d')
         ax.set_facecolor('#1a1a1a')
@@ -40,28 +42,31 @@ class Visualizer:
         
         if st.button("Generate Chart", type="primary"):
             try:
-                fig, ax = self._setup_dark_plot()
-                
-                if chart_type == "Scatter":
-                    ax.scatter(self.df[x_col], self.df[y_col], alpha=0.6, color='#ff6b35')
-                elif chart_type == "Line":
-                    ax.plot(self.df[x_col], self.df[y_col], color='#ff6b35', linewidth=2)
-                elif chart_type == "Bar":
-                    df_grouped = self.df.groupby(x_col)[y_col].mean()
-                    df_grouped.plot(kind='bar', ax=ax, color='#ff6b35')
-                elif chart_type == "Histogram":
-                    ax.hist(self.df[y_col].dropna(), bins=30, color='#ff6b35', edgecolor='#1a1a1a')
-                elif chart_type == "Box Plot":
-                    self.df[[x_col, y_col]].boxplot(ax=ax)
-                
-                ax.set_xlabel(x_col)
-                ax.set_ylabel(y_col)
-                ax.set_title(f"{chart_type}: {x_col} vs {y_col}")
-                plt.tight_layout()
-                st.pyplot(fig)
+                with span("chart.builder", chart=chart_type):
+                    import matplotlib.pyplot as plt
+                    fig, ax = self._setup_dark_plot()
+                    
+                    if chart_type == "Scatter":
+                        ax.scatter(self.df[x_col], self.df[y_col], alpha=0.6, color='#ff6b35')
+                    elif chart_type == "Line":
+                        ax.plot(self.df[x_col], self.df[y_col], color='#ff6b35', linewidth=2)
+                    elif chart_type == "Bar":
+                        df_grouped = self.df.groupby(x_col)[y_col].mean()
+                        df_grouped.plot(kind='bar', ax=ax, color='#ff6b35')
+                    elif chart_type == "Histogram":
+                        ax.hist(self.df[y_col].dropna(), bins=30, color='#ff6b35', edgecolor='#1a1a1a')
+                    elif chart_type == "Box Plot":
+                        self.df[[x_col, y_col]].boxplot(ax=ax)
+                    
+                    ax.set_xlabel(x_col)
+                    ax.set_ylabel(y_col)
+                    ax.set_title(f"{chart_type}: {x_col} vs {y_col}")
+                    plt.tight_layout()
+                    st.pyplot(fig)
             except Exception as e:
                 st.error(f"Error creating chart: {str(e)}")
     
+    @traced("chart.missing_values_analysis")
     def render_missing_values_analysis(self):
         """Render missing values analysis"""
         missing_df = pd.DataFrame({
@@ -74,6 +79,7 @@ class Visualizer:
         if len(missing_df) > 0:
             st.dataframe(missing_df, use_container_width=True)
             
+            import matplotlib.pyplot as plt
             fig, ax = self._setup_dark_plot()
             ax.barh(missing_df['Column'], missing_df['Missing %'], color='#ff6b35')
             ax.set_xlabel('Missing %', color='#e0e0e0')
@@ -83,6 +89,7 @@ class Visualizer:
         else:
             st.success("No missing values found")
     
+    @traced("chart.correlation_analysis")
     def render_correlation_analysis(self):
         """Render correlation heatmap and top correlations"""
         numeric_df = self.df.select_dtypes(include=['number'])
@@ -90,6 +97,8 @@ class Visualizer:
         if len(numeric_df.columns) > 1:
             corr_matrix = numeric_df.corr()
             
+            import matplotlib.pyplot as plt
+            import seaborn as sns
             fig, ax = self._setup_dark_plot(figsize=(10, 8))
             sns.heatmap(corr_matrix, annot=True, fmt='.2f', cmap='RdYlGn', 
                        center=0, ax=ax, cbar_kws={'label': 'Correlation'})
@@ -112,10 +121,12 @@ class Visualizer:
         else:
             st.info("Need at least 2 numeric columns for correlation analysis")
     
+    @traced("chart.distribution_analysis")
     def render_distribution_analysis(self):
         """Render distribution analysis with histogram and box plot"""
         if len(self.numeric_cols) > 0:
             selected_col = st.selectbox("Select column to analyze", self.numeric_cols)
+            import matplotlib.pyplot as plt
             
             col1, col2 = st.columns(2)
             
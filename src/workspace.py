@@ -0,0 +1,142 @@
+import keyword
+import os
+import re
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import WORKSPACE_MAX_DATASETS
+from data_handler import DataHandler
+from expr_optimizer import HELPERS as OPTIMIZER_HELPERS
+from prompt_builder import extend_profile
+from result_cache import assign_version
+
+# Names generated code already uses, and SQL keywords a table can't be called without quoting
+_RESERVED = {
+    "df", "pd", "np", "data", "prev",
+    "all", "and", "as", "by", "case", "check", "create", "cross", "default", "delete", "drop", "from",
+    "group", "having", "in", "index", "inner", "insert", "is", "join", "left", "limit", "natural", "not",
+    "null", "on", "or", "order", "outer", "right", "select", "table", "union", "update", "using",
+    "values", "when", "where",
+}
+
+
+def table_name(label, taken=()):
+    """Identifier for a dataset that works unquoted in pandas code and SQL, e.g. "Orders 2024.csv" -> orders_2024"""
+    base = re.sub(r"\.(csv|tsv|txt)$", "", os.path.basename(str(label)), flags=re.IGNORECASE)
+    name = re.sub(r"[^0-9a-z_]+", "_", base.lower()).strip("_") or "table"
+    if name[0].isdigit():
+        name = "t_" + name
+    if name in _RESERVED or name in OPTIMIZER_HELPERS or keyword.iskeyword(name):
+        name += "_table"
+    candidate, n = name, 2
+    while candidate in taken:
+        candidate = f"{name}_{n}"
+        n += 1
+    return candidate
+
+
+class Workspace:
+    """Datasets loaded in one session, each under a table name for generated code.
+
+    The active dataset is `df` (table `data`) in generated pandas/SQL; every
+    other one is available under its name for joins. Entries reference the
+    loaded frames, and the query engine and sandbox copy each dataset version
+    at most once however many questions use it.
+    """
+
+    def __init__(self, max_datasets=WORKSPACE_MAX_DATASETS):
+        self.max_datasets = max_datasets
+        self._datasets = OrderedDict()  # name -> {"df", "schema", "label", "source", "refresh"}
+
+    def add(self, label, df, schema, source, refresh=None):
+        """Add a dataset, replacing one loaded from the same label and source; returns its name.
+
+        refresh makes a database dataset incrementally refreshable: a dict with
+        db_type, params, table, column (the watermark), max_rows and table_info.
+        """
+        if refresh is not None:
+            refresh = dict(refresh, watermark=df[refresh["column"]].max() if len(df) else None,
+                           null_counts=df.isnull().sum(), added=0, auto=False, last_refresh=time.monotonic())
+        for name, entry in self._datasets.items():
+            if entry["label"] == label and entry["source"] == source:
+                self._datasets[name] = dict(entry, df=df, schema=schema, refresh=refresh)
+                return name
+        if len(self._datasets) >= self.max_datasets:
+            raise ValueError(f"The workspace holds at most {self.max_datasets} datasets; remove one first")
+        name = table_name(label, self._datasets)
+        self._datasets[name] = {"df": df, "schema": schema, "label": label, "source": source, "refresh": refresh}
+        return name
+
+    def refresh(self, name):
+        """Append rows beyond a refreshable dataset's watermark; returns (rows added, error).
+
+        The dataset keeps its newest max_rows rows. Null counts for the schema
+        and the prompt's column profile are updated from the new rows instead
+        of rescanning the whole frame.
+        """
+        entry = self._datasets[name]
+        spec = entry["refresh"]
+        spec["last_refresh"] = time.monotonic()
+        conn, _, error = DataHandler.load_from_database(spec["db_type"], spec["params"])
+        if error:
+            return 0, error
+        try:
+            new, error = DataHandler.load_increment(conn, spec["table"], spec["db_type"], spec["column"],
+                                                    spec["watermark"], spec["max_rows"])
+        finally:
+            DataHandler.release_connection(spec["db_type"], spec["params"], conn)
+        if error:
+            return 0, error
+        if new.empty:
+            return 0, None
+
+        old = entry["df"]
+        df = pd.concat([old, new], ignore_index=True)
+        # Columns missing on either side (schemaless sources) are null for those rows
+        null_counts = (spec["null_counts"].reindex(df.columns, fill_value=len(old))
+                       + new.isnull().sum().reindex(df.columns, fill_value=len(new)))
+        excess = len(df) - spec["max_rows"]
+        if excess > 0:
+            null_counts -= df.iloc[:excess].isnull().sum()
+            df = df.iloc[excess:].reset_index(drop=True)
+        assign_version(df)  # new contents, new version
+        if "sqlite_source" in old.attrs:
+            df.attrs["sqlite_source"] = old.attrs["sqlite_source"]
+        if excess <= 0:
+            extend_profile(old, new, df)  # dropped rows would leave stale ranges; profile lazily instead
+
+        entry["df"] = df
+        entry["schema"] = DataHandler.generate_schema(df, spec["db_type"], spec["table"], spec["table_info"],
+                                                      null_counts=null_counts)
+        spec.update(watermark=df[spec["column"]].max(), null_counts=null_counts, added=len(new))
+        return len(new), None
+
+    def due_for_refresh(self, interval):
+        """Names of datasets with auto-refresh on whose last refresh is at least interval seconds old"""
+        now = time.monotonic()
+        return [name for name, entry in self._datasets.items()
+                if entry["refresh"] and entry["refresh"]["auto"] and now - entry["refresh"]["last_refresh"] >= interval]
+
+    def remove(self, name):
+        self._datasets.pop(name, None)
+
+    def clear(self):
+        self._datasets.clear()
+
+    def get(self, name):
+        return self._datasets.get(name)
+
+    def names(self):
+        return list(self._datasets)
+
+    def tables(self, exclude=None):
+        """{name: df} of every dataset except exclude (the active one)"""
+        return {name: entry["df"] for name, entry in self._datasets.items() if name != exclude}
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def __contains__(self, name):
+        return name in self._datasets